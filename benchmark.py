@@ -0,0 +1,267 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import numpy as np
+import pygame
+from tracks import track_parser, select_track, load_track
+select_track(sys.argv)
+from simulation import (
+    Car, TrainingManager, TRACK_NAME, TRACK_FIELD, RAY_SENSOR, ACTIONS, CHECKPOINTS, WIDTH, HEIGHT, N_CARS,
+    ACCELERATE, BRAKE, ROTATE_LEFT, ROTATE_RIGHT
+)
+
+# Reproducible throughput numbers for the bundled track: fixed seeds, no window, one JSON report
+# that can be diffed against a stored baseline (python benchmark.py --baseline bench_baseline.json).
+# The whole suite runs REPEATS times and every metric keeps its best pass (noise only ever slows a
+# run down) plus the spread between passes, which compare() treats as that metric's noise floor.
+# Passes rather than back-to-back rounds, because a shared machine slows down for seconds at a
+# time: that way a slow stretch costs one sample of each metric instead of every sample of one.
+
+DEFAULT_CARS = (10, 20, 50)
+REPEATS = 5
+TRAINING_SEEDS = 5
+
+
+def metric(value, unit, better="higher"):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def best_of(samples):
+    # One metric from the same metric measured in every pass.
+    values = [m["value"] for m in samples]
+    better = samples[0]["better"]
+    median = float(np.median(values))
+    return dict(samples[0], value=max(values) if better == "higher" else min(values),
+                spread=(max(values) - min(values)) / median if median else 0.0)
+
+
+def timed(run, seconds):
+    # Calls run() (which returns how much work it did) until `seconds` elapse; work per second.
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        done += run()
+    return done / (time.perf_counter() - start)
+
+
+def bench_track_load(seconds):
+    # Mapping the compiled track pack (built at import if it was missing), what every process pays at startup.
+    def run():
+        load_track(TRACK_NAME)
+        return 1
+    return metric(1000 / timed(run, seconds), "ms", "lower")
+
+
+def bench_car_physics(seconds, seed):
+    rng = random.Random(seed)
+    car = Car(4, 4)
+
+    def run():
+        for _ in range(1000):
+            action = rng.randrange(len(ACTIONS))
+            if action == ROTATE_LEFT: car.rotate(left=True)
+            elif action == ROTATE_RIGHT: car.rotate(right=True)
+            if action == ACCELERATE: car.move_forward()
+            elif action == BRAKE: car.move_backward()
+            else: car.reduce_speed()
+            if not car.alive: car.reset()
+        return 1000
+    return metric(timed(run, seconds), "steps/s")
+
+
+def bench_collisions(seconds, seed):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, WIDTH, 10000)
+    y = rng.uniform(0, HEIGHT, 10000)
+    angle = rng.integers(0, 90, 10000).astype(np.float64) * 4
+    TRACK_FIELD.collides(x, y, angle)  # builds the angle bins outside the timed part
+    batched = timed(lambda: TRACK_FIELD.collides(x, y, angle).size, seconds)
+
+    poses = list(zip(x[:1000].tolist(), y[:1000].tolist(), angle[:1000].tolist()))
+
+    def single():
+        for px, py, pa in poses:
+            TRACK_FIELD.collides(px, py, pa)
+        return len(poses)
+    return {
+        "collision_checks_batched": metric(batched, "checks/s"),
+        "collision_checks_single": metric(timed(single, seconds), "checks/s"),
+    }
+
+
+def bench_rays(cars, seconds, seed):
+    # One cast() per tick for a population of n cars on random poses clear of the border.
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, WIDTH, 40000)
+    y = rng.uniform(0, HEIGHT, 40000)
+    clear = TRACK_FIELD.clearance(x, y) > 2
+    x, y = x[clear], y[clear]
+    angle = rng.integers(0, 90, x.size).astype(np.float64) * 4
+    RAY_SENSOR.cast(x, y, angle)  # builds the direction tables outside the timed part
+    results = {}
+    for n in cars:
+        ticks = [(x[k:k + n], y[k:k + n], angle[k:k + n]) for k in range(0, x.size - n, n)]
+
+        def run():
+            for tx, ty, ta in ticks:
+                RAY_SENSOR.cast(tx, ty, ta)
+            return len(ticks) * n * len(RAY_SENSOR.angles)
+        results[f"ray_casts_{n}_cars"] = metric(timed(run, seconds), "rays/s")
+    return results
+
+
+def fresh_manager(path, n_cars, seed, macro_steps=False):
+    random.seed(seed)
+    manager = TrainingManager(path, n_cars)
+    manager.macro_steps = macro_steps
+    manager.reset_car_to_segment_start()
+    return manager
+
+
+def bench_update(tmp, n_cars, seconds, seed, macro_steps):
+    manager = fresh_manager(os.path.join(tmp, f"update_{n_cars}_{macro_steps}.pkl"), n_cars, seed, macro_steps)
+
+    def run():
+        for _ in range(100):
+            manager.update()
+        return 100
+    rate = timed(run, seconds)
+    manager.close()
+    return metric(rate, "actions/s" if macro_steps else "frames/s")
+
+
+def train_once(tmp, seed, checkpoints, lap, max_seconds):
+    # Seconds and generations until each checkpoint is committed (macro steps, like headless).
+    manager = fresh_manager(os.path.join(tmp, f"training_{seed}.pkl"), N_CARS, seed, macro_steps=True)
+    results = {}
+    start = time.perf_counter()
+    target = len(CHECKPOINTS) if lap else checkpoints
+    reached = 0
+    while time.perf_counter() - start < max_seconds:
+        manager.update()
+        if manager.optimizing_full_lap:
+            results["first_lap"] = (time.perf_counter() - start, manager.generation)
+            break
+        if manager.start_checkpoint_idx > reached:
+            reached = manager.start_checkpoint_idx
+            if reached <= checkpoints:
+                results[f"checkpoint_{reached}"] = (time.perf_counter() - start, manager.generation)
+            if reached >= target:
+                break
+    manager.close()
+    return results, reached, manager.effective_mutation_rate()
+
+
+def bench_training(tmp, seed, checkpoints, lap, max_seconds):
+    # Averaged over TRAINING_SEEDS seeds, since one trajectory says little about the search. A
+    # checkpoint only gets metrics if every seed reached it.
+    runs = [train_once(tmp, s, checkpoints, lap, max_seconds) for s in range(seed, seed + TRAINING_SEEDS)]
+    results = {}
+    for name in runs[0][0]:
+        if all(name in times for times, _, _ in runs):
+            results[f"{name}_seconds"] = metric(float(np.mean([times[name][0] for times, _, _ in runs])), "s", "lower")
+            results[f"{name}_generations"] = metric(float(np.mean([times[name][1] for times, _, _ in runs])),
+                                                    "generations", "lower")
+    results["training_checkpoints_reached"] = metric(min(reached for _, reached, _ in runs), "checkpoints")
+    results["effective_mutation_share"] = metric(float(np.mean([share for _, _, share in runs])), "share")
+    return results
+
+
+def run_pass(tmp, cars, seconds, seed, checkpoints, lap, max_seconds):
+    metrics = {"track_pack_load": bench_track_load(seconds), "car_physics": bench_car_physics(seconds, seed)}
+    metrics.update(bench_collisions(seconds, seed))
+    metrics.update(bench_rays(cars, seconds, seed))
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in cars:
+            metrics[f"update_frames_{n}_cars"] = bench_update(tmp, n, seconds, seed, macro_steps=False)
+            metrics[f"update_actions_{n}_cars"] = bench_update(tmp, n, seconds, seed, macro_steps=True)
+        metrics.update(bench_training(tmp, seed, checkpoints, lap, max_seconds))
+    return metrics
+
+
+def run_suite(cars, seconds, seed, checkpoints, lap, max_seconds):
+    passes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for r in range(REPEATS):
+            # Every pass gets its own save files, so no trainer resumes from an earlier one.
+            os.mkdir(os.path.join(tmp, str(r)))
+            passes.append(run_pass(os.path.join(tmp, str(r)), cars, seconds, seed, checkpoints, lap, max_seconds))
+    metrics = {name: best_of([p[name] for p in passes if name in p]) for name in passes[0]}
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "track": TRACK_NAME,
+            "seed": seed,
+            "seconds": seconds,
+            "repeats": REPEATS,
+            "training_seeds": TRAINING_SEEDS,
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(report, baseline, tolerance):
+    # Prints one line per metric; returns the names that got worse by more than tolerance, or by
+    # more than the metric's spread between passes (in either report) if that is larger.
+    regressions = []
+    for name, current in report["metrics"].items():
+        old = baseline["metrics"].get(name)
+        value = f"{current['value']:14.{3 if current['unit'] == 's' else 1}f} {current['unit']:12}"
+        if old is None or not old["value"]:
+            print(f"{name:32} {value} (new)")
+            continue
+        change = current["value"] / old["value"] - 1
+        worse = -change if current["better"] == "higher" else change
+        limit = max(tolerance, current.get("spread", 0.0), old.get("spread", 0.0))
+        flag = "REGRESSION" if worse > limit else ""
+        if flag: regressions.append(name)
+        print(f"{name:32} {value} {change:+7.1%} {flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks", parents=[track_parser()])
+    parser.add_argument("--out", default="bench.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    parser.add_argument("--cars", default=",".join(map(str, DEFAULT_CARS)), help="population sizes for update()")
+    parser.add_argument("--seconds", type=float, default=0.5, help="time per throughput benchmark and pass")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="passes over the suite; each metric keeps its best")
+    parser.add_argument("--training-seeds", type=int, default=TRAINING_SEEDS, help="seeds the training metrics average over")
+    parser.add_argument("--checkpoints", type=int, default=5, help="time training up to checkpoint K")
+    parser.add_argument("--lap", action="store_true", help="keep training until the first full lap")
+    parser.add_argument("--max-seconds", type=float, default=600, help="give up on the training benchmark after this")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    args = parse_args()
+    REPEATS, TRAINING_SEEDS = args.repeats, args.training_seeds
+    report = run_suite([int(n) for n in args.cars.split(",")], args.seconds, args.seed,
+                       args.checkpoints, args.lap, args.max_seconds)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+    baseline = {"metrics": {}}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) vs {args.baseline}: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,195 @@
+import pygame
+import numpy as np
+from utils import rect_round
+
+
+def mask_to_array(mask):
+    surf = mask.to_surface(setcolor=(255, 255, 255, 255), unsetcolor=(0, 0, 0, 255))
+    return pygame.surfarray.array_red(surf).T > 0
+
+
+def rect_round_array(values):
+    return np.where(values >= 0, np.floor(values + 0.5), np.ceil(values - 0.5)).astype(np.int64)
+
+
+def distance_to(occupied, max_distance):
+    # Capped Euclidean distance from every pixel to the nearest occupied one (0 on occupied pixels).
+    h, w = occupied.shape
+    cap = max_distance + 1
+    col = np.where(occupied, 0, cap).astype(np.float64)
+    for y in range(1, h):
+        col[y] = np.minimum(col[y], col[y - 1] + 1)
+    for y in range(h - 2, -1, -1):
+        col[y] = np.minimum(col[y], col[y + 1] + 1)
+    col = np.minimum(col, cap) ** 2
+
+    padded = np.full((h, w + 2 * cap), cap * cap, dtype=np.float64)
+    padded[:, cap:cap + w] = col
+    best = col.copy()
+    for d in range(1, cap + 1):
+        best = np.minimum(best, np.minimum(padded[:, cap - d:cap - d + w], padded[:, cap + d:cap + d + w]) + d * d)
+    return np.minimum(np.sqrt(best), max_distance)
+
+
+class CarMaskBank:
+    # One mask per quantized angle, rotated and centered exactly like utils.blit_rotate_center,
+    # so the hitbox is the sprite that actually gets drawn.
+    def __init__(self, image, angle_step=1):
+        self.angle_step = angle_step
+        self.bins = round(360 / angle_step)
+        self.width, self.height = image.get_size()
+        self.masks = []
+        self.offsets = []
+        for b in range(self.bins):
+            rotated = pygame.transform.rotate(image, b * angle_step)
+            self.masks.append(pygame.mask.from_surface(rotated))
+            self.offsets.append((self.width // 2 - rotated.get_width() // 2,
+                                 self.height // 2 - rotated.get_height() // 2))
+
+    def angle_bin(self, angle):
+        return round(angle / self.angle_step) % self.bins
+
+    def place(self, x, y, angle):
+        # Mask plus the top-left corner it is blitted at for a car whose sprite sits at (x, y).
+        b = self.angle_bin(angle)
+        dx, dy = self.offsets[b]
+        return self.masks[b], rect_round(x) + dx, rect_round(y) + dy
+
+    def overlap(self, mask, x, y, angle):
+        car_mask, left, top = self.place(x, y, angle)
+        return mask.overlap(car_mask, (left, top))
+
+
+class TrackField:
+    # The track border as arrays: an occupancy grid, a signed distance field (px, negative inside the
+    # border) and, per car angle bin, the set of sprite positions that overlap the border.
+    PAD = 64
+
+    def __init__(self, border_mask, car_masks, max_distance=64, pack=None):
+        self.border_mask = border_mask
+        self.car_masks = car_masks
+        self.max_distance = max_distance
+        if pack is not None:
+            # Occupancy, SDF and every collision bin precompiled in a track pack (see tracks.py).
+            self.occupancy, self.sdf, self.grids = pack["occupancy"], pack["sdf"], pack["collision_grids"]
+            self.height, self.width = self.occupancy.shape
+            self.grid_h, self.grid_w = self.height + 2 * self.PAD, self.width + 2 * self.PAD
+            self.built = np.ones(car_masks.bins, dtype=bool)
+            return
+        self.occupancy = mask_to_array(border_mask)
+        self.height, self.width = self.occupancy.shape
+        self.sdf = (distance_to(self.occupancy, max_distance)
+                    - distance_to(~self.occupancy, max_distance)).astype(np.float32)
+
+        # Collision grids are indexed by the sprite's rounded top-left, shifted by PAD, bit-packed
+        # along x. tracks.build_pack() fills every bin; collides() builds any it finds missing.
+        self.grid_h = self.height + 2 * self.PAD
+        self.grid_w = self.width + 2 * self.PAD
+        self.grids = np.zeros((car_masks.bins, self.grid_h, (self.grid_w + 7) // 8), dtype=np.uint8)
+        self.built = np.zeros(car_masks.bins, dtype=bool)
+
+    def build_bin(self, b):
+        car_mask = self.car_masks.masks[b]
+        dx, dy = self.car_masks.offsets[b]
+        rw, rh = car_mask.get_size()
+        hits = mask_to_array(self.border_mask.convolve(car_mask))
+        # convolve() sets (left + rw - 1, top + rh - 1) for every overlapping placement.
+        grid = np.zeros((self.grid_h, self.grid_w), dtype=bool)
+        top = -dy - rh + 1 + self.PAD
+        left = -dx - rw + 1 + self.PAD
+        grid[top:top + hits.shape[0], left:left + hits.shape[1]] = hits
+        self.grids[b] = np.packbits(grid, axis=1)
+        self.built[b] = True
+
+    def angle_bins(self, angle):
+        bins = self.car_masks.bins
+        return np.mod(np.round(np.asarray(angle, dtype=np.float64) / self.car_masks.angle_step), bins).astype(np.int64)
+
+    def collides(self, x, y, angle):
+        b = self.angle_bins(angle)
+        missing = b[~self.built[b]]
+        for m in np.unique(missing).tolist():
+            self.build_bin(m)
+        gx = rect_round_array(np.asarray(x, dtype=np.float64)) + self.PAD
+        gy = rect_round_array(np.asarray(y, dtype=np.float64)) + self.PAD
+        inside = (gx >= 0) & (gx < self.grid_w) & (gy >= 0) & (gy < self.grid_h)
+        gx = np.where(inside, gx, 0)
+        gy = np.where(inside, gy, 0)
+        bits = (self.grids[b, gy, gx >> 3] >> (7 - (gx & 7))) & 1
+        return inside & (bits == 1)
+
+    def distance(self, px, py):
+        # Signed distance to the nearest border pixel at points (px, py); off-track reads as max_distance.
+        ix = np.floor(np.asarray(px, dtype=np.float64)).astype(np.int64)
+        iy = np.floor(np.asarray(py, dtype=np.float64)).astype(np.int64)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+        values = self.sdf[np.where(inside, iy, 0), np.where(inside, ix, 0)]
+        return np.where(inside, values, self.max_distance)
+
+    def clearance(self, x, y):
+        # Distance from the car's center to the wall, for sprites whose top-left sits at (x, y).
+        return self.distance(np.asarray(x) + self.car_masks.width / 2, np.asarray(y) + self.car_masks.height / 2)
+
+    def verify(self, samples=20000, seed=0):
+        # Equivalence check against the mask-based overlap() result on random poses.
+        rng = np.random.default_rng(seed)
+        x = rng.uniform(-60, self.width + 60, samples)
+        y = rng.uniform(-60, self.height + 60, samples)
+        angle = rng.integers(-720, 720, samples).astype(np.float64)
+        fast = self.collides(x, y, angle)
+        slow = np.array([self.car_masks.overlap(self.border_mask, cx, cy, ca) is not None
+                         for cx, cy, ca in zip(x.tolist(), y.tolist(), angle.tolist())])
+        return int((fast != slow).sum())
+
+
+class CheckpointField:
+    # Every checkpoint is the same radius-R disc, so one table per car angle bin covers them all:
+    # table[b, dy, dx] says whether the car sprite at that offset from the disc's corner touches it.
+    PAD = 64
+
+    def __init__(self, car_masks, checkpoints, radius):
+        self.car_masks = car_masks
+        self.checkpoints = np.array(checkpoints, dtype=np.int64)
+        self.radius = radius
+        self.cp_mask = self.disc_mask(radius)
+        size = 2 * radius + 2 * self.PAD
+        self.tables = np.zeros((car_masks.bins, size, size), dtype=bool)
+        for b, car_mask in enumerate(car_masks.masks):
+            dx, dy = car_masks.offsets[b]
+            rw, rh = car_mask.get_size()
+            hits = mask_to_array(self.cp_mask.convolve(car_mask))
+            top = -dy - rh + 1 + self.PAD
+            left = -dx - rw + 1 + self.PAD
+            self.tables[b, top:top + hits.shape[0], left:left + hits.shape[1]] = hits
+
+    @staticmethod
+    def disc_mask(radius):
+        cp_surface = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
+        pygame.draw.circle(cp_surface, (255, 255, 255), (radius, radius), radius)
+        return pygame.mask.from_surface(cp_surface)
+
+    def hits(self, x, y, angle, checkpoint_idx):
+        b = np.mod(np.round(np.asarray(angle, dtype=np.float64) / self.car_masks.angle_step),
+                   self.car_masks.bins).astype(np.int64)
+        corner = self.checkpoints[checkpoint_idx] - self.radius
+        tx = rect_round_array(np.asarray(x, dtype=np.float64)) - corner[..., 0] + self.PAD
+        ty = rect_round_array(np.asarray(y, dtype=np.float64)) - corner[..., 1] + self.PAD
+        size = self.tables.shape[1]
+        inside = (tx >= 0) & (tx < size) & (ty >= 0) & (ty < size)
+        return inside & self.tables[b, np.where(inside, ty, 0), np.where(inside, tx, 0)]
+
+    def verify(self, samples=20000, seed=0):
+        # Equivalence check against the per-call Surface + mask overlap the trainer used to do.
+        rng = np.random.default_rng(seed)
+        cp = rng.integers(0, len(self.checkpoints), samples)
+        x = self.checkpoints[cp, 0] + rng.uniform(-60, 40, samples)
+        y = self.checkpoints[cp, 1] + rng.uniform(-60, 40, samples)
+        angle = rng.integers(-720, 720, samples).astype(np.float64)
+        fast = self.hits(x, y, angle, cp)
+        slow = []
+        for cx, cy, ca, c in zip(x.tolist(), y.tolist(), angle.tolist(), cp.tolist()):
+            car_mask, left, top = self.car_masks.place(cx, cy, ca)
+            target = self.checkpoints[c]
+            offset = (int(target[0]) - self.radius - left, int(target[1]) - self.radius - top)
+            slow.append(car_mask.overlap(self.disc_mask(self.radius), offset) is not None)
+        return int((fast != np.array(slow)).sum())
@@ -0,0 +1,204 @@
+import os
+import time
+import pickle
+import struct
+import threading
+import zlib
+
+RECORD_HEADER = struct.Struct("<II")  # payload length, crc32
+
+
+class Journal:
+    # Save file = a full snapshot (pickle, replaced atomically) + an append-only log of small
+    # records next to it. Records carry a sequence number and the snapshot remembers the last one
+    # it contains, so a crash between writing a snapshot and truncating the log can't replay twice.
+    def __init__(self, path, compact_every=25):
+        self.path = path
+        self.log_path = path + ".journal"
+        self.compact_every = compact_every
+        self.seq = 0
+        self.pending = 0
+
+    def load(self):
+        # (snapshot or None, records newer than it). A torn record at the tail (crash mid-append)
+        # ends the replay; everything before it is kept and the torn bytes are cut off, so later
+        # appends land right after the last good record. Unreadable snapshots raise.
+        snapshot = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        base = snapshot.get("journal_seq", 0) if snapshot else 0
+        self.seq = base
+        records = []
+        for seq, record in self.read_log():
+            if seq > base:
+                records.append(record)
+                self.seq = seq
+        self.pending = len(records)
+        return snapshot, records
+
+    def read_log(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, pos)
+            payload = data[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            yield pickle.loads(payload)
+            pos += RECORD_HEADER.size + length
+        if pos < len(data):
+            print(f"Journal: dropping torn record at byte {pos} of {self.log_path}")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def append(self, record):
+        # Returns True once enough records piled up that the caller should compact().
+        self.seq += 1
+        self.write_records([(self.seq, record)])
+        self.pending += 1
+        return self.pending >= self.compact_every
+
+    def compact(self, snapshot):
+        self.write_snapshot(self.seq, snapshot)
+        self.pending = 0
+
+    def write_records(self, records):
+        data = b""
+        for item in records:
+            payload = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+            data += RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def write_snapshot(self, seq, snapshot):
+        # Full snapshot through a temp file + os.replace, then the log it supersedes is dropped.
+        snapshot = dict(snapshot, journal_seq=seq)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def quarantine(self):
+        # Moves an unreadable save aside so the next compaction can't overwrite what's left of it.
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                os.replace(path, path + ".corrupt")
+        return self.path + ".corrupt"
+
+    def clear(self):
+        for path in (self.path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.seq = 0
+        self.pending = 0
+
+
+class AsyncJournal(Journal):
+    # Same files, written by a background thread so commits don't stall the trainer. Callers hand
+    # over immutable data and return at once; queued records go out in one write, and a snapshot
+    # supersedes every record queued before it. blocked_time is what the caller spent in here.
+    def __init__(self, path, compact_every=25):
+        super().__init__(path, compact_every)
+        self.cond = threading.Condition()
+        self.queued_records = []
+        self.queued_snapshot = None
+        self.busy = False
+        self.closed = False
+        self.thread = None
+        self.error = None
+        self.submitted = 0
+        self.writes = 0
+        self.blocked_time = 0.0
+
+    def submit(self, records=(), snapshot=None):
+        start = time.perf_counter()
+        with self.cond:
+            self.raise_error()
+            self.submitted += 1
+            if snapshot is not None:
+                self.queued_records = []
+                self.queued_snapshot = snapshot
+            self.queued_records.extend(records)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        self.blocked_time += time.perf_counter() - start
+
+    def append(self, record):
+        self.seq += 1
+        self.submit(records=[(self.seq, record)])
+        self.pending += 1
+        return self.pending >= self.compact_every
+
+    def compact(self, snapshot):
+        self.submit(snapshot=(self.seq, snapshot))
+        self.pending = 0
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.queued_records and self.queued_snapshot is None:
+                    self.busy = False
+                    self.cond.notify_all()
+                    if self.closed:
+                        return
+                    self.cond.wait()
+                self.busy = True
+                records, snapshot = self.queued_records, self.queued_snapshot
+                self.queued_records, self.queued_snapshot = [], None
+            try:
+                if snapshot is not None:
+                    self.write_snapshot(*snapshot)
+                if records:
+                    self.write_records(records)
+                self.writes += 1
+            except Exception as e:
+                print(f"Autosave failed: {e!r}")
+                with self.cond:
+                    self.error = e
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+        # Blocks until everything handed over so far is on disk.
+        start = time.perf_counter()
+        with self.cond:
+            while self.busy or self.queued_records or self.queued_snapshot is not None:
+                self.cond.wait()
+            self.raise_error()
+        self.blocked_time += time.perf_counter() - start
+
+    def close(self):
+        # Flushes and stops the writer thread; call on shutdown.
+        self.flush()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.closed = False
+
+    def clear(self):
+        self.flush()
+        super().clear()
+
+    def report(self):
+        return (f"Autosave: {self.submitted} saves in {self.writes} writes, "
+                f"trainer blocked {self.blocked_time * 1000:.1f} ms")
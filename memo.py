@@ -0,0 +1,52 @@
+from collections import OrderedDict, Counter
+
+
+class ResultCache:
+    # Bounded LRU of finished evaluations. A run is fully determined by its context (start
+    # state, checkpoint, mode) and the actions it actually executed: everything after the
+    # action it crashed or finished on is never read. So entries are keyed by that effective
+    # prefix, and a new candidate hits if any cached prefix is a prefix of its actions.
+    # Runs that used up every action depend on the length too, so they key on all of it.
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.prefix_lengths = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        context, prefix, _ = key
+        self.prefix_lengths.setdefault(context, Counter())[len(prefix)] += 1
+        while len(self.entries) > self.max_entries:
+            (context, prefix, _), _ = self.entries.popitem(last=False)
+            lengths = self.prefix_lengths[context]
+            lengths[len(prefix)] -= 1
+            if not lengths[len(prefix)]:
+                del lengths[len(prefix)]
+            if not lengths:
+                del self.prefix_lengths[context]
+
+    def store(self, context, actions, executed, exhausted, result):
+        key = (context, actions if exhausted else actions[:executed], exhausted)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        else:
+            self._remember(key, result)
+
+    def lookup(self, context, actions):
+        keys = [(context, actions, True)]
+        keys += [(context, actions[:k], False) for k in self.prefix_lengths.get(context, ()) if k <= len(actions)]
+        for key in keys:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+        self.misses += 1
+        return None
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
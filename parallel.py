@@ -0,0 +1,23 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from simulation import evaluate_rows
+
+
+class ParallelEvaluator:
+    # Splits a generation's running cars across worker processes. Each worker imports
+    # simulation once (track masks, fields) and simulates its rows to completion; rows
+    # are independent, so the merged result is identical to the single-process run.
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    def evaluate(self, pop, optimizing_full_lap):
+        rows = np.flatnonzero(pop.alive & ~pop.finished)
+        chunks = [c for c in np.array_split(rows, self.workers) if c.size]
+        futures = [self.pool.submit(evaluate_rows, pop.export_rows(c), pop.max_vel, pop.rotation_vel,
+                                    optimizing_full_lap) for c in chunks]
+        for chunk, future in zip(chunks, futures):
+            pop.import_rows(chunk, future.result())
+
+    def close(self):
+        self.pool.shutdown()
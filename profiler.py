@@ -0,0 +1,78 @@
+import json
+import time
+from collections import Counter, defaultdict
+
+
+class Profiler:
+    # Phase timers and counters for the training loop. Call sites check `enabled` first, so a
+    # disabled profiler costs one attribute lookup per phase:
+    #     prof = PROFILER if PROFILER.enabled else None
+    #     if prof: t = prof.now()
+    #     ...
+    #     if prof: t = prof.lap("movement", t)
+    def __init__(self):
+        self.enabled = False
+        self.dump_path = None
+        self.dump_interval = 10.0
+        self.reset()
+
+    def reset(self):
+        self.times = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.generations_per_checkpoint = []
+        self.started = self.last_dump = time.perf_counter()
+
+    def now(self):
+        return time.perf_counter()
+
+    def lap(self, phase, start):
+        now = time.perf_counter()
+        self.times[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def acceptance_rate(self):
+        proposals = self.counters["proposals"]
+        return self.counters["accepted"] / proposals if proposals else 0.0
+
+    def snapshot(self):
+        return {
+            "time": time.time(),
+            "elapsed": time.perf_counter() - self.started,
+            "phases": {phase: {"seconds": self.times[phase], "calls": self.calls[phase]} for phase in self.times},
+            "counters": dict(self.counters),
+            "acceptance_rate": self.acceptance_rate(),
+            "generations_per_checkpoint": list(self.generations_per_checkpoint),
+        }
+
+    def dump(self, path=None):
+        # One JSON object per line, so periodic snapshots of a long run stack up in one file.
+        with open(path or self.dump_path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+        self.last_dump = time.perf_counter()
+
+    def maybe_dump(self):
+        if self.enabled and self.dump_path and time.perf_counter() - self.last_dump >= self.dump_interval:
+            self.dump()
+
+    def summary_lines(self):
+        total = sum(self.times.values()) or 1e-9
+        lines = []
+        for phase, seconds in sorted(self.times.items(), key=lambda item: -item[1]):
+            per_call = seconds / self.calls[phase] * 1e6
+            lines.append(f"{phase:21} {seconds / total:4.0%} {per_call:8.1f}us")
+        lines.append(f"accepted {self.acceptance_rate():.0%} of {self.counters['proposals']}")
+        for name, n in sorted(self.counters.items()):
+            if "->" in name:
+                lines.append(f"{name} x{n}")
+        if self.generations_per_checkpoint:
+            recent = self.generations_per_checkpoint[-4:]
+            lines.append("gens/CP " + " ".join(f"{cp}:{gens}" for cp, gens in recent))
+        return lines
+
+
+PROFILER = Profiler()
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+
+RAY_ANGLES = (-80, -40, -20, 0, 20, 40, 80)  # degrees off the heading, positive = to the car's left
+
+
+class RaySensor:
+    # Distance from the car's center to the track border along M fixed directions, for N cars
+    # at once. Car angles move in 4 degree steps and the ray offsets are multiples of 4 too, so
+    # every ray points along one of 90 directions. Per direction there's a table of distances
+    # from every cell x cell block of the track, precomputed by sphere tracing the SDF
+    # (each step advances the ray by its distance to the nearest border pixel, less hit_radius,
+    # so it can't jump over a wall). After that a cast is one gather. A ray from the block's
+    # center stops once it passes within hit_radius px of the border: a car elsewhere in the
+    # block whose ray just grazes a corner then reads short instead of seeing through the wall.
+    def __init__(self, field, angles=RAY_ANGLES, max_range=255, angle_step=4, cell=2, hit_radius=1.5, min_step=0.25,
+                 tables=None):
+        self.field = field
+        self.angles = np.asarray(angles, dtype=np.float64)
+        self.offsets = np.radians(self.angles)
+        self.max_range = min(max_range, 255)  # tables are uint8
+        self.angle_step = angle_step
+        self.cell = cell
+        self.hit_radius = hit_radius
+        self.min_step = min_step
+        self.margin = 60
+        self.pad = int(self.max_range) + self.margin + 2
+        self.height, self.width = field.sdf.shape
+        self.steps = None
+        self.rays = 0
+
+        # The track pack (see tracks.py) hands over every table; without one, cast() traces the
+        # directions it needs as it meets them.
+        self.bins = round(360 / angle_step)
+        self.rows, self.cols = -(-self.height // cell), -(-self.width // cell)
+        if tables is not None:
+            self.tables = tables
+            self.built = np.ones(self.bins, dtype=bool)
+        else:
+            self.tables = np.zeros((self.bins, self.rows, self.cols), dtype=np.uint8)
+            self.built = np.zeros(self.bins, dtype=bool)
+
+    def build_steps(self):
+        # Step lengths, precomputed from the SDF and padded by max_range (plus a margin for
+        # origins just off the image) on every side so lookups need no bounds checks: 0 within
+        # hit_radius of the border (the ray stops there), the distance to the image outside it
+        # (a safe step). Grazing rays creep along at min_step px, the pixel march's step; never
+        # more than the SDF allows, or they would step through one pixel thick walls.
+        pad, h, w = self.pad, self.height, self.width
+        yy, xx = np.mgrid[-pad:h + pad, -pad:w + pad]
+        outside = np.maximum(np.maximum(-xx, xx - (w - 1)), np.maximum(-yy, yy - (h - 1)))
+        inside = self.field.sdf[np.clip(yy, 0, h - 1), np.clip(xx, 0, w - 1)]
+        inside = np.where(inside > self.hit_radius, np.maximum(inside - self.hit_radius, self.min_step), 0)
+        self.steps = np.where(outside > 0, outside, inside).astype(np.float64).ravel()
+        self.grid_w = w + 2 * pad
+
+    def origins(self, x, y):
+        # Car center for sprites whose top-left sits at (x, y).
+        masks = self.field.car_masks
+        return np.asarray(x, dtype=np.float64) + masks.width / 2, np.asarray(y, dtype=np.float64) + masks.height / 2
+
+    def directions(self, angle):
+        # Cars drive towards (-sin, -cos) of their angle (see Car.move).
+        a = np.radians(np.asarray(angle, dtype=np.float64))[..., None] + self.offsets
+        return -np.sin(a), -np.cos(a)
+
+    def trace(self, ox, oy, dx, dy):
+        # Sphere traces rays from points (ox, oy) along unit vectors (dx, dy), all flat arrays.
+        # Every step is at least min_step px, so a ray is done after max_range / min_step steps.
+        if self.steps is None:
+            self.build_steps()
+        px = np.clip(ox, -self.margin, self.width + self.margin) + self.pad
+        py = np.clip(oy, -self.margin, self.height + self.margin) + self.pad
+        t = np.zeros(px.size)
+        active = np.arange(px.size)
+        while active.size:
+            cell = (py[active] + dy[active] * t[active]).astype(np.int64) * self.grid_w
+            cell += (px[active] + dx[active] * t[active]).astype(np.int64)
+            step = self.steps[cell]
+            t[active] = np.minimum(t[active] + step, self.max_range)
+            active = active[(step > 0) & (t[active] < self.max_range)]
+        return t
+
+    def build_bin(self, b):
+        a = math.radians(b * self.angle_step)
+        rows, cols = np.mgrid[0:self.rows, 0:self.cols]
+        ox = (cols.ravel() + 0.5) * self.cell
+        oy = (rows.ravel() + 0.5) * self.cell
+        t = self.trace(ox, oy, np.full(ox.size, -math.sin(a)), np.full(ox.size, -math.cos(a)))
+        self.tables[b] = np.rint(t).reshape(self.rows, self.cols)
+        self.built[b] = True
+
+    def ray_bins(self, angle):
+        a = np.asarray(angle, dtype=np.float64)[..., None] + self.angles
+        return np.mod(np.round(a / self.angle_step), self.bins).astype(np.int64)
+
+    def cast(self, x, y, angle):
+        # (N, M) distances to the border; max_range where a ray hits nothing within range.
+        ox, oy = self.origins(np.atleast_1d(x), np.atleast_1d(y))
+        b = self.ray_bins(np.atleast_1d(angle))
+        missing = b[~self.built[b]]
+        for m in np.unique(missing).tolist():
+            self.build_bin(m)
+        col = np.clip((ox // self.cell).astype(np.int64), 0, self.cols - 1)
+        row = np.clip((oy // self.cell).astype(np.int64), 0, self.rows - 1)
+        self.rays += b.size
+        return self.tables[b, row[:, None], col[:, None]].astype(np.float64)
+
+    def endpoints(self, x, y, angle, distances):
+        # Origins (N, 2) and hit points (N, M, 2), for drawing.
+        ox, oy = self.origins(np.atleast_1d(x), np.atleast_1d(y))
+        dx, dy = self.directions(np.atleast_1d(angle))
+        hits = np.stack((ox[:, None] + dx * distances, oy[:, None] + dy * distances), axis=-1)
+        return np.stack((ox, oy), axis=1), hits
+
+    def march(self, x, y, angle, step=0.25):
+        # Reference: walk each ray in small steps until it lands on a border pixel.
+        ox, oy = self.origins(x, y)
+        occupancy = self.field.occupancy
+        h, w = occupancy.shape
+        readings = []
+        for offset in self.offsets.tolist():
+            a = math.radians(angle) + offset
+            dx, dy = -math.sin(a), -math.cos(a)
+            t = 0.0
+            while t < self.max_range:
+                px, py = math.floor(ox + dx * t), math.floor(oy + dy * t)
+                if 0 <= px < w and 0 <= py < h and occupancy[py, px]:
+                    break
+                t += step
+            readings.append(min(t, self.max_range))
+        return np.array(readings)
+
+    def verify(self, samples=300, seed=0):
+        # Cast vs marched distances in px over random poses clear of the border, at car angles:
+        # mean and 99th percentile of |cast - marched|, and the furthest a cast reads past a wall.
+        rng = np.random.default_rng(seed)
+        x = rng.uniform(0, self.field.width, samples * 4)
+        y = rng.uniform(0, self.field.height, samples * 4)
+        clear = self.field.clearance(x, y) > 2
+        x, y = x[clear][:samples], y[clear][:samples]
+        angle = rng.integers(-180, 180, x.size).astype(np.float64) * self.angle_step
+        fast = self.cast(x, y, angle)
+        slow = np.array([self.march(px, py, pa) for px, py, pa in zip(x.tolist(), y.tolist(), angle.tolist())])
+        error = np.abs(fast - slow)
+        return float(error.mean()), float(np.percentile(error, 99)), float(max((fast - slow).max(), 0.0))
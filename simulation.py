@@ -0,0 +1,1229 @@
+import pygame
+import math
+import random
+import pickle
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from array import array
+from utils import SpriteCache
+from collision import CarMaskBank, TrackField, CheckpointField
+from memo import ResultCache
+from journal import AsyncJournal
+from profiler import PROFILER
+from sensors import RaySensor
+from tracks import DEFAULT_TRACK, load_track, load_images
+
+################## Assets (no window needed) ##################
+
+# Picked by name (TRACK=<name>, see tracks.TRACKS); fields come precompiled from its track pack.
+TRACK_NAME = os.environ.get("TRACK", DEFAULT_TRACK)
+try:
+    TRACK_PACK = load_track(TRACK_NAME)
+    IMAGES = load_images(TRACK_PACK.definition)
+except Exception as e:
+    print(f"Error loading track {TRACK_NAME!r}. {e}")
+    sys.exit(1)
+GRASS = IMAGES["grass"]
+TRACK = IMAGES["track"]
+TRACK_BORDER = IMAGES["border"]
+FINISH = IMAGES["finish"]
+RED_CAR = IMAGES["car"]
+TRACK_BORDER_MASK = pygame.mask.from_surface(TRACK_BORDER)
+
+FINISH_POSITION = TRACK_PACK.finish_position
+START_LINE = TRACK_PACK.start_line
+WIDTH, HEIGHT = TRACK.get_width(), TRACK.get_height()
+CAR_MASKS = CarMaskBank(RED_CAR)
+TRACK_FIELD = TrackField(TRACK_BORDER_MASK, CAR_MASKS, pack=TRACK_PACK.arrays)
+RAY_SENSOR = RaySensor(TRACK_FIELD, tables=TRACK_PACK.arrays["ray_tables"])
+
+N_CARS = 20
+SAVE_PATH = "saved_state.pkl"
+
+#### basics ########
+
+ACTIONS = ["ACCELERATE", "BRAKE", "ROTATE_LEFT", "ROTATE_RIGHT", "GO_STRAIGHT"]
+ACTION_REPEAT = 4
+CHECKPOINT_RADIUS = 5
+
+CHECKPOINTS = TRACK_PACK.checkpoints
+
+##### Car class ####
+
+class Car:
+    IMG = RED_CAR
+    SPRITES = SpriteCache(RED_CAR)
+    START_POS = TRACK_PACK.start_pos
+
+    def __init__(self, max_vel, rotation_vel):
+        self.max_vel = max_vel
+        self.rotation_vel = rotation_vel
+        self.img = self.IMG
+        self.reset()
+
+    def reset(self):
+        self.vel = 0
+        self.angle = 0
+        self.x, self.y = self.START_POS
+        self.acceleration = 0.1
+        self.alive = True
+
+    def get_state(self):
+        return {
+            "x": self.x, "y": self.y,
+            "angle": self.angle, "vel": self.vel,
+            "alive": self.alive
+        }
+
+    def set_state(self, state):
+        self.x = state["x"]
+        self.y = state["y"]
+        self.angle = state["angle"]
+        self.vel = state["vel"]
+        self.alive = state["alive"]
+
+    def rotate(self, left=False, right=False):
+        if left: self.angle += self.rotation_vel
+        elif right: self.angle -= self.rotation_vel
+
+    def draw(self, win):
+        return self.SPRITES.blit(win, (self.x, self.y), self.angle)
+
+    def move_forward(self):
+        self.vel = min(self.vel + self.acceleration, self.max_vel)
+        self.move()
+
+    def move_backward(self):
+        self.vel = max(self.vel - self.acceleration, -self.max_vel/2)
+        self.move()
+
+    def reduce_speed(self):
+        if self.vel > 0:
+            self.vel = max(self.vel - self.acceleration/2, 0)
+        else:
+            self.vel = min(self.vel + self.acceleration/2, 0)
+        self.move()
+
+    def move(self):
+        radians = math.radians(self.angle)
+        vertical = math.cos(radians) * self.vel
+        horizontal = math.sin(radians) * self.vel
+        self.y -= vertical
+        self.x -= horizontal
+        self.check_collision()
+
+    def check_collision(self):
+        if TRACK_FIELD.collides(self.x, self.y, self.angle):
+            self.alive = False
+
+    def clearance(self):
+        return float(TRACK_FIELD.clearance(self.x, self.y))
+
+    def sensors(self):
+        # Distances to the border along RAY_SENSOR's rays (optional; the trainer doesn't use them).
+        return RAY_SENSOR.cast(self.x, self.y, self.angle)[0]
+
+##### Population (batch physics) ####
+
+ACCELERATE, BRAKE, ROTATE_LEFT, ROTATE_RIGHT, GO_STRAIGHT = range(len(ACTIONS))
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+CHECKPOINT_XY = np.array(CHECKPOINTS, dtype=np.float64)
+CHECKPOINT_FIELD = CheckpointField(CAR_MASKS, CHECKPOINTS, CHECKPOINT_RADIUS)
+SNAPSHOT_INTERVAL = 10
+MUTATION_WINDOW = 15  # actions before the crash step that localized mutations aim at
+LOCAL_SHARE = 0.75  # share of mutations inside that window; the rest anywhere before the crash
+SNAPSHOT_FIELDS = ("x", "y", "angle", "vel", "reward", "prev_distance", "closest_dist", "checkpoint_idx")
+ROW_FIELDS = ("actions", "lengths", "x", "y", "angle", "vel", "alive", "finished", "step_index", "frame_counter",
+              "checkpoint_idx", "reward", "prev_distance", "closest_dist", "path", "path_len", "snaps", "snap_count")
+
+
+def encode_actions(actions):
+    return np.fromiter((ACTION_CODES[a] for a in actions), dtype=np.uint8, count=len(actions))
+
+
+def frozen(codes):
+    # Accepted sequences are read-only uint8 arrays, so they can be shared instead of copied.
+    codes = np.asarray(codes, dtype=np.uint8)
+    codes.flags.writeable = False
+    return codes
+
+
+class Mutation:
+    # Copy-on-write candidate: the accepted sequence plus the positions it overwrites. It is only
+    # written out in full into its Population row. Later changes to a position win.
+    def __init__(self, base, changes):
+        self.base = base
+        self.positions = np.fromiter(changes.keys(), dtype=np.int64, count=len(changes))
+        self.codes = np.fromiter(changes.values(), dtype=np.uint8, count=len(changes))
+
+    def __len__(self):
+        return len(self.base)
+
+    def write(self, row):
+        row[:len(self.base)] = self.base
+        row[self.positions] = self.codes
+
+    def effective(self, stop):
+        # Whether any change lands on an action the base actually executed (it stopped at `stop`).
+        return bool(((self.positions <= stop) & (self.codes != self.base[self.positions])).any())
+
+
+def entry_angle_score(x, y, angle, checkpoint_idx):
+    next_target = CHECKPOINTS[(checkpoint_idx + 1) % len(CHECKPOINTS)]
+    dx = next_target[0] - x
+    dy = next_target[1] - y
+    ideal_angle = math.degrees(math.atan2(dy, dx)) + 90
+    diff = abs((ideal_angle - angle + 180) % 360 - 180)
+    return max(0, 1.0 - (diff / 180.0))
+
+
+class Population:
+    # Struct-of-arrays twin of Car + the per-car sim state: row i is car i.
+    def __init__(self, n, max_vel, rotation_vel):
+        self.n = n
+        self.max_vel = max_vel
+        self.rotation_vel = rotation_vel
+        self.acceleration = 0.1
+        self.half_w = RED_CAR.get_width() / 2
+        self.half_h = RED_CAR.get_height() / 2
+        self.reset(None, [[] for _ in range(n)], 0)
+        self.alive[:] = False
+
+    def reset(self, start_state, action_lists, checkpoint_idx):
+        n = self.n
+        length = max(len(a) for a in action_lists)
+        self.actions = np.zeros((n, length), dtype=np.uint8)
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.float64)
+        self.y = np.zeros(n, dtype=np.float64)
+        self.angle = np.zeros(n, dtype=np.float64)
+        self.vel = np.zeros(n, dtype=np.float64)
+        self.alive = np.zeros(n, dtype=bool)
+        self.finished = np.zeros(n, dtype=bool)
+        self.step_index = np.zeros(n, dtype=np.int64)
+        self.frame_counter = np.zeros(n, dtype=np.int64)
+        self.checkpoint_idx = np.zeros(n, dtype=np.int64)
+        self.reward = np.zeros(n, dtype=np.float64)
+        self.prev_distance = np.zeros(n, dtype=np.float64)
+        self.closest_dist = np.zeros(n, dtype=np.float64)
+        self.path = np.zeros((n, length, 2), dtype=np.float64)
+        self.path_len = np.zeros(n, dtype=np.int64)
+        self.pruned = np.zeros(n, dtype=bool)
+
+        # Row state every SNAPSHOT_INTERVAL steps, slot j = state right before action j*K runs.
+        self.snaps = np.zeros((n, length // SNAPSHOT_INTERVAL + 1, len(SNAPSHOT_FIELDS)), dtype=np.float64)
+        self.snap_count = np.zeros(n, dtype=np.int64)
+        self.launch(np.arange(n), start_state, action_lists, checkpoint_idx)
+
+    def launch(self, rows, start_state, action_lists, checkpoint_idx):
+        # (Re)starts the given rows from start_state with fresh action sequences.
+        for i, actions in zip(rows.tolist(), action_lists):
+            self.actions[i] = 0
+            if isinstance(actions, Mutation): actions.write(self.actions[i])
+            else: self.actions[i, :len(actions)] = actions
+            self.lengths[i] = len(actions)
+
+        if start_state:
+            x, y = start_state["x"], start_state["y"]
+            angle, vel = start_state["angle"], start_state["vel"]
+        else:
+            (x, y), angle, vel = Car.START_POS, 0, 0
+        self.x[rows], self.y[rows] = x, y
+        self.angle[rows], self.vel[rows] = angle, vel
+        self.alive[rows] = True
+        self.finished[rows] = False
+        self.pruned[rows] = False
+        self.step_index[rows] = 0
+        self.frame_counter[rows] = 0
+        self.checkpoint_idx[rows] = checkpoint_idx
+
+        target = CHECKPOINTS[checkpoint_idx]
+        prev_dist = math.hypot(x - target[0], y - target[1])
+        self.reward[rows] = 0
+        self.prev_distance[rows] = prev_dist
+        self.closest_dist[rows] = prev_dist
+        self.path_len[rows] = 0
+        self.snaps[rows, 0] = self.snapshot_rows(rows)
+        self.snap_count[rows] = 1
+
+    def export_rows(self, rows):
+        return {f: getattr(self, f)[rows] for f in ROW_FIELDS}
+
+    def import_rows(self, rows, data):
+        for f in ROW_FIELDS:
+            getattr(self, f)[rows] = data[f]
+
+    @classmethod
+    def from_rows(cls, data, max_vel, rotation_vel):
+        pop = cls.__new__(cls)
+        pop.n = len(data["x"])
+        pop.max_vel, pop.rotation_vel, pop.acceleration = max_vel, rotation_vel, 0.1
+        pop.half_w, pop.half_h = RED_CAR.get_width() / 2, RED_CAR.get_height() / 2
+        for f in ROW_FIELDS:
+            setattr(pop, f, data[f])
+        return pop
+
+    def run_to_completion(self, optimizing_full_lap=False, macro=True):
+        step = self.macro_tick if macro else self.tick
+        ticks = 0
+        while step(optimizing_full_lap):
+            ticks += 1
+        return ticks
+
+    def snapshot_rows(self, rows):
+        return np.stack([getattr(self, f)[rows] for f in SNAPSHOT_FIELDS], axis=1)
+
+    def snapshot_track(self, i):
+        count = int(self.snap_count[i])
+        steps = (count - 1) * SNAPSHOT_INTERVAL
+        return SnapshotTrack(self.actions[i, :self.lengths[i]].tobytes(), self.snaps[i, :count].copy(),
+                             self.path[i, :steps].copy(), int(self.step_index[i]))
+
+    def resume(self, rows, track, slots):
+        # Fast-forward rows whose actions match track's up to slot*K to that snapshot.
+        for f, column in zip(SNAPSHOT_FIELDS, track.snaps[slots].T):
+            values = getattr(self, f)
+            values[rows] = column.astype(values.dtype)
+        steps = slots * SNAPSHOT_INTERVAL
+        self.step_index[rows] = steps
+        self.frame_counter[rows] = 0
+        self.path_len[rows] = steps
+        for i, slot, step in zip(rows.tolist(), slots.tolist(), steps.tolist()):
+            self.path[i, :step] = track.path[:step]
+            self.snaps[i, :slot + 1] = track.snaps[:slot + 1]
+            self.snap_count[i] = slot + 1
+
+    def get_state(self, i):
+        return {
+            "x": self.x[i].item(), "y": self.y[i].item(),
+            "angle": self.angle[i].item(), "vel": self.vel[i].item(),
+            "alive": bool(self.alive[i])
+        }
+
+    def approach_state(self, i, target):
+        # Row i's state at its closest approach to target, replayed frame by frame (without
+        # collisions) from the prefix snapshot before the closest one.
+        snaps = self.snaps[i, :self.snap_count[i]]
+        slot = max(int(np.argmin(np.hypot(snaps[:, 0] - target[0], snaps[:, 1] - target[1]))) - 1, 0)
+        x, y, angle, vel = snaps[slot, :4, None]  # SNAPSHOT_FIELDS start with x, y, angle, vel
+        best = (math.hypot(x[0] - target[0], y[0] - target[1]), x, y, angle, vel)
+        last = min(int(self.step_index[i]), (slot + 2) * SNAPSHOT_INTERVAL, int(self.lengths[i]) - 1)
+        for step in range(slot * SNAPSHOT_INTERVAL, last + 1):
+            action = self.actions[i, step:step + 1]
+            for _ in range(ACTION_REPEAT):
+                x, y, angle, vel = self.kinematics(action, x, y, angle, vel)
+                dist = math.hypot(x[0] - target[0], y[0] - target[1])
+                if dist < best[0]:
+                    best = (dist, x, y, angle, vel)
+        _, x, y, angle, vel = best
+        return {"x": x.item(), "y": y.item(), "angle": angle.item(), "vel": vel.item(), "alive": True}
+
+    def path_points(self, i):
+        return [tuple(p) for p in self.path[i, :self.path_len[i]].tolist()]
+
+    def actions_taken(self, i):
+        return self.actions[i, :self.step_index[i] + 1]
+
+    def clearance(self):
+        return TRACK_FIELD.clearance(self.x, self.y)
+
+    def sensors(self, rows=None):
+        # (rows, M) ray readings; all rows by default.
+        rows = np.arange(self.n) if rows is None else rows
+        return RAY_SENSOR.cast(self.x[rows], self.y[rows], self.angle[rows])
+
+    def sync_car(self, i, car):
+        car.x, car.y = self.x[i].item(), self.y[i].item()
+        car.angle, car.vel = self.angle[i].item(), self.vel[i].item()
+        car.alive = bool(self.alive[i])
+
+    def expire(self, active, optimizing_full_lap):
+        # Cars that ran out of actions spend this tick being scored, without moving.
+        exhausted = active & (self.step_index >= self.lengths)
+        if exhausted.any():
+            if optimizing_full_lap:
+                self.reward[exhausted] += 5000
+                self.finished[exhausted] = True
+            else:
+                self.reward[exhausted] -= 200
+                self.alive[exhausted] = False
+        return np.flatnonzero(active & ~exhausted)
+
+    def kinematics(self, action, x, y, angle, vel):
+        acc = self.acceleration
+        vel = np.where(action == ACCELERATE, np.minimum(vel + acc, self.max_vel), vel)
+        vel = np.where(action == BRAKE, np.maximum(vel - acc, -self.max_vel/2), vel)
+        vel = np.where(action == GO_STRAIGHT, np.where(vel > 0, np.maximum(vel - acc/2, 0), 0), vel)
+        angle = np.where(action == ROTATE_LEFT, angle + self.rotation_vel, angle)
+        angle = np.where(action == ROTATE_RIGHT, angle - self.rotation_vel, angle)
+
+        radians = np.radians(angle)
+        y = y - np.cos(radians) * vel
+        x = x - np.sin(radians) * vel
+        return x, y, angle, vel
+
+    def checkpoint_reward(self, x, y, angle, cp, optimizing_full_lap):
+        # (reward bonus, next checkpoint index, new prev_distance, finished) for a car touching checkpoint cp.
+        if optimizing_full_lap:
+            # A lap candidate collects the checkpoint and drives on towards the next one.
+            next_cp = (cp + 1) % len(CHECKPOINTS)
+            next_target = CHECKPOINTS[next_cp]
+            return 2000, next_cp, math.hypot(x - next_target[0], y - next_target[1]), False
+        angle_quality = entry_angle_score(x, y, angle, cp)
+        bonus = 2000 + (1000 * angle_quality)
+        if angle_quality < 0.3: bonus -= 500
+        return bonus, cp, None, True
+
+    def reward_bound(self, idx):
+        # Segment runs only. (most reward rows idx can still end with, whether they can still
+        # reach their checkpoint). Speed changes by at most acceleration per frame, so frame k
+        # from now covers at most min(max_vel, |vel| + k * acceleration), and a checkpoint hit
+        # needs dist < 60. Distance rewards telescope to 5 * (distance now - distance at the end).
+        # A run that never gets there stops at best on the -200 out-of-actions penalty.
+        frames_left = np.maximum((self.lengths[idx] - self.step_index[idx]) * ACTION_REPEAT - self.frame_counter[idx], 0)
+        speed, acc = np.minimum(np.abs(self.vel[idx]), self.max_vel), self.acceleration
+        ramp = np.minimum(np.floor((self.max_vel - speed) / acc), frames_left)  # frames still speeding up
+        reach = ramp * speed + acc * ramp * (ramp + 1) / 2 + (frames_left - ramp) * self.max_vel + 1e-6
+        can_finish = self.prev_distance[idx] - reach < 60
+        return self.reward[idx] + 5 * reach - 200, can_finish
+
+    def record_snapshots(self, done):
+        snap = done[self.step_index[done] % SNAPSHOT_INTERVAL == 0]
+        if snap.size:
+            slot = self.step_index[snap] // SNAPSHOT_INTERVAL
+            self.snaps[snap, slot] = self.snapshot_rows(snap)
+            self.snap_count[snap] = slot + 1
+
+    def tick(self, optimizing_full_lap=False):
+        # One frame for every running car; mirrors Car.move_* + TrainingManager's reward rules.
+        prof = PROFILER if PROFILER.enabled else None
+        if prof: t = prof.now()
+        active = self.alive & ~self.finished
+        active_count = int(active.sum())
+        if not active_count:
+            return 0
+
+        idx = self.expire(active, optimizing_full_lap)
+        if not idx.size:
+            return active_count
+
+        # Physics stuff
+        action = self.actions[idx, self.step_index[idx]]
+        if prof: t = prof.lap("action dispatch", t)
+        x, y, angle, vel = self.kinematics(action, self.x[idx], self.y[idx], self.angle[idx], self.vel[idx])
+        self.x[idx], self.y[idx] = x, y
+        self.angle[idx], self.vel[idx] = angle, vel
+        if prof: t = prof.lap("movement", t)
+
+        # Path Vis
+        first_frame = idx[self.frame_counter[idx] == 0]
+        self.path[first_frame, self.path_len[first_frame]] = np.stack(
+            (self.x[first_frame] + self.half_w, self.y[first_frame] + self.half_h), axis=1)
+        self.path_len[first_frame] += 1
+
+        # Reward calculations
+        target = CHECKPOINT_XY[self.checkpoint_idx[idx]]
+        dist = np.hypot(x - target[:, 0], y - target[:, 1])
+        self.closest_dist[idx] = np.minimum(self.closest_dist[idx], dist)
+        improvement = self.prev_distance[idx] - dist
+        reward = self.reward[idx] + improvement * 5
+        self.prev_distance[idx] = dist
+        reward -= np.where((vel < 0) & (improvement <= 0), 0.1, 0)
+        self.reward[idx] = reward
+        if prof: t = prof.lap("reward update", t)
+
+        crashed = TRACK_FIELD.collides(x, y, angle)
+        self.alive[idx[crashed]] = False
+        self.reward[idx[crashed]] -= 1000
+        if prof: t = prof.lap("border collision", t)
+
+        near = np.flatnonzero(~crashed & (dist < 60))
+        if near.size:
+            near = near[CHECKPOINT_FIELD.hits(x[near], y[near], angle[near], self.checkpoint_idx[idx[near]])]
+        for k in near.tolist():
+            i = idx[k]
+            bonus, cp, prev, finished = self.checkpoint_reward(x[k], y[k], angle[k], int(self.checkpoint_idx[i]),
+                                                               optimizing_full_lap)
+            self.reward[i] += bonus
+            self.checkpoint_idx[i] = cp
+            if prev is not None: self.prev_distance[i] = prev
+            self.finished[i] = finished
+        if prof: t = prof.lap("checkpoint test", t)
+
+        running = idx[self.alive[idx] & ~self.finished[idx]]
+        self.frame_counter[running] += 1
+        done = running[self.frame_counter[running] >= ACTION_REPEAT]
+        self.step_index[done] += 1
+        self.frame_counter[done] = 0
+        self.record_snapshots(done)
+        if prof: prof.lap("action dispatch", t)
+        return active_count
+
+    def macro_tick(self, optimizing_full_lap=False):
+        # One whole action (ACTION_REPEAT frames) per running car in a single call: the sub-steps are
+        # integrated up front, collisions are swept over all of them in one lookup, then rewards are
+        # replayed frame by frame in the same order as tick() so results match it bit for bit.
+        active = self.alive & ~self.finished
+        if (self.frame_counter[active] != 0).any():
+            return self.tick(optimizing_full_lap)
+        prof = PROFILER if PROFILER.enabled else None
+        if prof: t = prof.now()
+        active_count = int(active.sum())
+        if not active_count:
+            return 0
+
+        idx = self.expire(active, optimizing_full_lap)
+        if not idx.size:
+            return active_count
+
+        m, frames = idx.size, ACTION_REPEAT
+        action = self.actions[idx, self.step_index[idx]]
+        if prof: t = prof.lap("action dispatch", t)
+        xs, ys = np.empty((m, frames)), np.empty((m, frames))
+        angles, vels = np.empty((m, frames)), np.empty((m, frames))
+        x, y, angle, vel = self.x[idx], self.y[idx], self.angle[idx], self.vel[idx]
+        for f in range(frames):
+            x, y, angle, vel = self.kinematics(action, x, y, angle, vel)
+            xs[:, f], ys[:, f], angles[:, f], vels[:, f] = x, y, angle, vel
+        if prof: t = prof.lap("movement", t)
+        crashes = TRACK_FIELD.collides(xs.ravel(), ys.ravel(), angles.ravel()).reshape(m, frames)
+        if prof: t = prof.lap("border collision", t)
+
+        # Path Vis
+        self.path[idx, self.path_len[idx]] = np.stack((xs[:, 0] + self.half_w, ys[:, 0] + self.half_h), axis=1)
+        self.path_len[idx] += 1
+
+        reward, prev = self.reward[idx].copy(), self.prev_distance[idx].copy()
+        closest, cps = self.closest_dist[idx].copy(), self.checkpoint_idx[idx].copy()
+        alive, finished = np.ones(m, dtype=bool), np.zeros(m, dtype=bool)
+        stop = np.full(m, frames - 1)
+        run = np.ones(m, dtype=bool)
+        for f in range(frames):
+            x, y, vel = xs[:, f], ys[:, f], vels[:, f]
+            target = CHECKPOINT_XY[cps]
+            dist = np.hypot(x - target[:, 0], y - target[:, 1])
+            closest = np.where(run, np.minimum(closest, dist), closest)
+            improvement = prev - dist
+            stepped = reward + improvement * 5
+            stepped -= np.where((vel < 0) & (improvement <= 0), 0.1, 0)
+            reward = np.where(run, stepped, reward)
+            prev = np.where(run, dist, prev)
+
+            crashed = run & crashes[:, f]
+            reward[crashed] -= 1000
+            alive[crashed] = False
+            if prof: t = prof.lap("reward update", t)
+
+            near = np.flatnonzero(run & ~crashed & (dist < 60))
+            if near.size:
+                near = near[CHECKPOINT_FIELD.hits(x[near], y[near], angles[near, f], cps[near])]
+            for k in near.tolist():
+                bonus, cp, new_prev, done = self.checkpoint_reward(x[k], y[k], angles[k, f], int(cps[k]),
+                                                                   optimizing_full_lap)
+                reward[k] += bonus
+                cps[k] = cp
+                if new_prev is not None: prev[k] = new_prev
+                finished[k] = done
+            if prof: t = prof.lap("checkpoint test", t)
+
+            ended = run & (crashed | finished)
+            stop[ended] = f
+            run &= ~ended
+
+        last = np.arange(m), stop
+        self.x[idx], self.y[idx] = xs[last], ys[last]
+        self.angle[idx], self.vel[idx] = angles[last], vels[last]
+        self.reward[idx], self.prev_distance[idx] = reward, prev
+        self.closest_dist[idx], self.checkpoint_idx[idx] = closest, cps
+        self.alive[idx], self.finished[idx] = alive, finished
+
+        # Stopped cars keep the frames they completed; survivors roll over to the next action.
+        self.frame_counter[idx[~run]] = stop[~run]
+        done = idx[run]
+        self.step_index[done] += 1
+        self.record_snapshots(done)
+        if prof: prof.lap("action dispatch", t)
+        return active_count
+
+class SnapshotTrack:
+    # Snapshots recorded along one action sequence (raw uint8 codes) from the current segment start.
+    def __init__(self, actions, snaps, path, stop):
+        self.actions = actions
+        self.snaps = snaps
+        self.path = path
+        self.stop = stop  # action index the run crashed, finished or ran out on
+
+##### AI MANAGER ######
+
+class TrainingManager:
+    # Run-time switches set by the front end; they survive full_reset().
+    OPTIONS = ("use_snapshots", "use_result_cache", "steady_state", "evaluator", "macro_steps", "tempering", "telemetry",
+               "local_mutation", "pruning", "verify_pruning", "speculator")
+
+    def __init__(self, save_path=SAVE_PATH, n_cars=N_CARS):
+        self.save_path = save_path
+        self.journal = AsyncJournal(save_path)
+        self.n_cars = n_cars
+        self.committed_actions = array("B")
+        self.committed_path_points = [Car.START_POS]
+        self.path_version = 0  # bumped whenever committed_path_points changes, for the viewer's cache
+        self.start_state = None
+        self.start_checkpoint_idx = 0
+
+        self.history_stack = []
+
+        self.current_segment_actions = self.random_actions(150)
+        self.best_segment_actions = self.current_segment_actions
+        self.best_segment_score = -99999
+        self.accepted_score = -99999
+
+        self.stagnation_counter = 0
+        self.STAGNATION_THRESHOLD = 20
+        self.optimizing_full_lap = False
+        self.best_lap_time = 99999
+
+        self.population = Population(n_cars, 4, 4)
+        self.current_track = None
+        self.best_track = None
+        self.use_snapshots = True
+        self.use_result_cache = True
+        self.result_cache = ResultCache()
+        self.from_cache = np.zeros(n_cars, dtype=bool)
+        self.steady_state = False
+        self.evaluator = None
+        self.macro_steps = False
+        self.tempering = None
+        self.telemetry = None
+        self.local_mutation = True
+        self.mutations = 0
+        self.effective_mutations = 0
+        self.pruning = False
+        self.speculator = None
+        self.verify_pruning = False
+        self.pruned_rows = 0
+        self.pruned_frames = 0
+        self.pruning_violations = 0
+        self.resumed_steps = 0
+        self.generation = 0
+        self.steady_folds = 0  # steady-state: results folded since the last generation was counted
+        self.segment_generation = 0
+        self.step_index_global = 0
+
+        self.INITIAL_TEMP = 200
+        self.T = self.INITIAL_TEMP
+        self.cooling = 0.99
+        self.mode = "COOLING"
+
+        self.load_model()
+
+    def random_actions(self, length):
+        return frozen([random.randrange(len(ACTIONS)) for _ in range(length)])
+
+    def full_reset(self):
+        self.journal.clear()
+        self.journal.close()
+        options = {name: getattr(self, name) for name in self.OPTIONS}
+        path_version = self.path_version
+        self.__init__(self.save_path, self.n_cars)
+        self.__dict__.update(options)
+        self.path_version = path_version + 1
+        self.reset_car_to_segment_start()
+        print("TRAINING RESET.")
+
+    def undo_last_segment(self):
+        if self.optimizing_full_lap:
+            print("Cannot undo during full optimization.")
+            return
+        if not self.history_stack:
+            print("Nothing to undo!")
+            return
+        print("Undoing last segment...")
+        self.apply_undo()
+        self.invalidate_snapshots()
+        self.reset_car_to_segment_start()
+        self.record({"op": "undo"})
+
+    def start_full_optimization(self):
+        print(f"ENTERING OPTIMIZE MODE. Current Path Length: {len(self.committed_actions)} frames")
+        self.optimizing_full_lap = True
+        self.invalidate_snapshots()
+        self.current_segment_actions = frozen(np.concatenate(
+            (np.frombuffer(self.committed_actions, dtype=np.uint8), self.random_actions(100))))
+        self.best_segment_actions = self.current_segment_actions
+        self.start_state = None
+        self.start_checkpoint_idx = 0
+        self.T = 50
+        self.mode = "PRECISION"
+        self.best_segment_score = -99999
+        self.accepted_score = -99999
+        self.reset_car_to_segment_start()
+
+    def load_model(self):
+        # Snapshot, then the journal records written since it. An unreadable snapshot is moved
+        # aside (never silently overwritten by the next save) and training starts fresh.
+        try:
+            data, records = self.journal.load()
+            if data is not None:
+                actions = data["committed_actions"]
+                if actions and isinstance(actions[0], str):
+                    actions = encode_actions(actions)  # saves from before the compact format
+                state = (array("B", bytes(actions)), list(data.get("committed_path", [Car.START_POS])),
+                         data["start_state"], data["start_checkpoint_idx"],
+                         list(data.get("history_stack", [])), data.get("best_lap_time", 99999))
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError, ValueError) as e:
+            print(f"Could not load save file ({e!r}); moved it to {self.journal.quarantine()}.")
+            return
+        if data is None and not records:
+            return
+        if data is not None:
+            (self.committed_actions, self.committed_path_points, self.start_state,
+             self.start_checkpoint_idx, self.history_stack, self.best_lap_time) = state
+        for record in records:
+            self.replay(record)
+        print(f"Hot Resume: Loaded previous state ({len(records)} journal records).")
+
+    def save_model(self):
+        # Full snapshot; also compacts the journal. Written in the background, so it gets
+        # immutable copies of the growing lists.
+        data = {
+            "committed_actions": self.committed_actions.tobytes(),
+            "committed_path": tuple(self.committed_path_points),
+            "start_state": self.start_state,
+            "start_checkpoint_idx": self.start_checkpoint_idx,
+            "history_stack": tuple(self.history_stack),
+            "best_lap_time": self.best_lap_time
+        }
+        self.journal.compact(data)
+
+    def close(self):
+        # Waits for pending saves; call once the trainer is done.
+        self.journal.close()
+        if self.telemetry: self.telemetry.close()
+
+    def record(self, record):
+        # One small journal record per commit/undo instead of re-pickling everything.
+        if self.journal.append(record):
+            self.save_model()
+
+    def replay(self, record):
+        op = record["op"]
+        if op == "commit":
+            self.apply_commit(record["actions"], record["path"], record["state"])
+        elif op == "lap":
+            self.apply_lap(record["actions"], record["path"])
+            self.start_state = None
+            self.start_checkpoint_idx = 0
+        elif op == "undo":
+            self.apply_undo()
+
+    def apply_commit(self, actions, path, state):
+        self.history_stack.append((
+            self.start_state,
+            len(self.committed_actions),
+            len(self.committed_path_points)
+        ))
+
+        self.committed_actions.frombytes(actions)
+        self.committed_path_points.extend(path)
+        self.path_version += 1
+
+        self.start_state = state
+        self.start_checkpoint_idx = (self.start_checkpoint_idx + 1) % len(CHECKPOINTS)
+
+    def apply_lap(self, actions, path):
+        self.committed_actions.frombytes(actions)
+        self.committed_path_points.extend(path)
+        self.path_version += 1
+
+        total_frames = len(self.committed_actions) * ACTION_REPEAT
+        self.best_lap_time = total_frames / 60
+
+    def apply_undo(self):
+        last_state, actions_len, path_len = self.history_stack.pop()
+        self.start_state = last_state
+        self.committed_actions = self.committed_actions[:actions_len]
+        self.committed_path_points = self.committed_path_points[:path_len]
+        self.path_version += 1
+        self.start_checkpoint_idx = (self.start_checkpoint_idx - 1) % len(CHECKPOINTS)
+
+    def create_mutated_actions(self, base=None, T=None, stop=None):
+        # base/T default to the single chain's state; replicas pass their own. stop is where
+        # base crashed or stalled (None if unknown): changes after it would never be executed,
+        # so mutations go before it, mostly into a window that widens as the search stagnates.
+        base = self.current_segment_actions if base is None else base
+        T = self.T if T is None else T
+        if self.mode == "PRECISION": rate = 1
+        elif self.mode == "PANIC": rate = 5
+        else: rate = 1 if T <= 100 else 3
+
+        last = len(base) - 1
+        # A run that used up every action didn't stall anywhere in particular (it was just too
+        # slow), so its mutations spread over the whole sequence.
+        local = stop is not None and stop < last and self.local_mutation
+        if not local:
+            pick = lambda: random.randint(0, last)
+        else:
+            last = min(stop, last)
+            first = max(0, last - int(MUTATION_WINDOW * (1 + self.stagnation_counter / 10)))
+            pick = lambda: random.randint(first if random.random() < LOCAL_SHARE else 0, last)
+
+        changes = {}
+        for _ in range(random.randint(1, rate)):
+            idx = pick()
+            changes[idx] = random.randrange(len(ACTIONS))
+
+        if self.mode != "PRECISION" and random.random() < 0.2:
+            block_size = random.randint(5, 10)
+            if len(base) > block_size:
+                if local: start_idx = min(pick(), len(base) - block_size)
+                else: start_idx = random.randint(0, len(base) - block_size)
+                forced_action = random.choice((ROTATE_LEFT, ROTATE_RIGHT, ACCELERATE))
+                for i in range(start_idx, start_idx + block_size):
+                    changes[i] = forced_action
+        mutation = Mutation(base, changes)
+        if stop is not None:
+            self.mutations += 1
+            self.effective_mutations += mutation.effective(stop)
+        return mutation
+
+    def failure_step(self, track, actions):
+        # Where actions stopped, if track was recorded from exactly that sequence.
+        if track is None or track.actions != actions.tobytes():
+            return None
+        return track.stop
+
+    def effective_mutation_rate(self):
+        return self.effective_mutations / self.mutations if self.mutations else 0.0
+
+    def invalidate_snapshots(self):
+        # Snapshots only hold for the start state / checkpoint / mode they were recorded from.
+        self.current_track = None
+        self.best_track = None
+
+    def reset_car_to_segment_start(self):
+        prof = PROFILER if PROFILER.enabled else None
+        if prof: t = prof.now()
+        if self.tempering:
+            self.reset_replicas()
+        else:
+            stop = self.failure_step(self.current_track, self.current_segment_actions)
+            candidates = []
+            for i in range(self.n_cars):
+                if i == 0 and self.mode != "PANIC":
+                     candidates.append(self.current_segment_actions)
+                else:
+                     candidates.append(self.create_mutated_actions(stop=stop))
+            self.population.reset(self.start_state, candidates, self.start_checkpoint_idx)
+            self.resume_from_snapshots(self.apply_cached_results(np.arange(self.n_cars)))
+        if prof: prof.lap("mutation", t)
+
+    def reset_replicas(self):
+        # Parallel tempering: each replica's slice is filled with mutations of its own sequence.
+        # Its current sequence is not re-run, so acceptance rates count real moves only.
+        ladder = self.tempering
+        if ladder.context != self.cache_context():
+            ladder.seed(self.cache_context(), self.current_segment_actions)
+        self.mode = "TEMPERING"
+        candidates = []
+        for replica, rows in zip(ladder.replicas, ladder.slices):
+            stop = self.failure_step(replica.track, replica.actions)
+            candidates += [self.create_mutated_actions(replica.actions, replica.T, stop) for _ in rows]
+        self.population.reset(self.start_state, candidates, self.start_checkpoint_idx)
+        missed = self.apply_cached_results(np.arange(self.n_cars))
+        for replica, rows in zip(ladder.replicas, ladder.slices):
+            self.resume_from_snapshots(np.intersect1d(missed, rows), replica.track, replica.actions)
+
+    def launch_slot(self, i):
+        # Steady-state: a finished slot immediately gets a fresh mutation of the accepted sequence.
+        rows = np.array([i])
+        stop = self.failure_step(self.current_track, self.current_segment_actions)
+        self.population.launch(rows, self.start_state, [self.create_mutated_actions(stop=stop)], self.start_checkpoint_idx)
+        self.resume_from_snapshots(self.apply_cached_results(rows))
+
+    def cache_context(self):
+        start = self.start_state
+        start_key = (start["x"], start["y"], start["angle"], start["vel"]) if start else None
+        return (start_key, self.start_checkpoint_idx, self.optimizing_full_lap)
+
+    def apply_cached_results(self, rows):
+        # Fills rows whose outcome is already known; returns the rows that still need simulating.
+        self.from_cache[rows] = False
+        if not self.use_result_cache:
+            return rows
+        pop = self.population
+        context = self.cache_context()
+        missed = []
+        for i in rows.tolist():
+            result = self.result_cache.lookup(context, pop.actions[i, :pop.lengths[i]].tobytes())
+            if result is None or result["actions"].shape != pop.actions[i].shape:
+                missed.append(i)
+                continue
+            actions = pop.actions[i].copy()
+            pop.import_rows(i, result)
+            pop.actions[i] = actions
+            self.from_cache[i] = True
+        return np.array(missed, dtype=np.int64)
+
+    def store_results(self, rows):
+        if not self.use_result_cache:
+            return
+        pop = self.population
+        context = self.cache_context()
+        for i in rows.tolist():
+            if self.from_cache[i] or pop.pruned[i]:
+                continue
+            length = int(pop.lengths[i])
+            step = int(pop.step_index[i])
+            result = {f: np.array(v) for f, v in pop.export_rows(i).items()}
+            self.result_cache.store(context, pop.actions[i, :length].tobytes(), step + 1, step >= length, result)
+
+    def resume_from_snapshots(self, rows, track=None, actions=None):
+        # Rows are mutations of actions (the accepted sequence by default), recorded in track.
+        pop = self.population
+        if actions is None:
+            track, actions = self.current_track, self.current_segment_actions
+        if not self.use_snapshots or track is None or len(track.actions) != pop.actions.shape[1]:
+            return
+        base = np.frombuffer(track.actions, dtype=np.uint8)
+        if not np.array_equal(base, actions):
+            return
+        diff = pop.actions[rows] != base
+        first_change = np.where(diff.any(axis=1), diff.argmax(axis=1), len(base))
+        slots = np.minimum(first_change // SNAPSHOT_INTERVAL, len(track.snaps) - 1)
+        rows, slots = rows[slots > 0], slots[slots > 0]
+        if rows.size:
+            pop.resume(rows, track, slots)
+            self.resumed_steps += int(slots.sum()) * SNAPSHOT_INTERVAL
+
+    def get_smart_initialization(self, car_state):
+        target = CHECKPOINTS[(self.start_checkpoint_idx) % len(CHECKPOINTS)]
+        dx = target[0] - car_state["x"]
+        dy = target[1] - car_state["y"]
+        target_angle = math.degrees(math.atan2(dy, dx)) + 90
+        diff = (target_angle - car_state["angle"] + 180) % 360 - 180
+
+        actions = []
+        for _ in range(150):
+            r = random.random()
+            if r < 0.6:
+                if diff > 10: actions.append(ROTATE_LEFT)
+                elif diff < -10: actions.append(ROTATE_RIGHT)
+                else: actions.append(ACCELERATE)
+            else:
+                actions.append(random.randrange(len(ACTIONS)))
+        return frozen(actions)
+
+    def commit_segment(self, i):
+        pop = self.population
+        if PROFILER.enabled:
+            PROFILER.generations_per_checkpoint.append(
+                (self.start_checkpoint_idx + 1, self.generation - self.segment_generation))
+        if self.speculator: self.speculator.finish_segment(self.generation - self.segment_generation)
+        self.segment_generation = self.generation
+        self.invalidate_snapshots()
+        actions, path = pop.actions_taken(i).tobytes(), pop.path_points(i)
+        if self.start_checkpoint_idx == len(CHECKPOINTS) - 1:
+            print("LAP FINISHED! Saving full run.")
+            self.apply_lap(actions, path)
+            self.record({"op": "lap", "actions": actions, "path": path})
+            self.start_full_optimization()
+            return
+
+        state = pop.get_state(i)
+        self.apply_commit(actions, path, state)
+
+        print(f"Checkpoint {self.start_checkpoint_idx} Reached! Committed.")
+
+        warm = self.speculator.claim(self.start_checkpoint_idx, self.start_state) if self.speculator else None
+        self.current_segment_actions = warm if warm is not None else self.get_smart_initialization(self.start_state)
+        self.best_segment_actions = self.current_segment_actions
+        self.best_segment_score = -99999
+        self.accepted_score = -99999
+        self.stagnation_counter = 0
+        self.T = self.INITIAL_TEMP
+        self.mode = "COOLING"
+
+        self.record({"op": "commit", "actions": actions, "path": path, "state": state})
+        self.reset_car_to_segment_start()
+
+    def prune_hopeless(self):
+        # PRECISION only accepts a candidate scoring at least best_segment_score, and once the
+        # stagnation counter is past 20 the mode stays PRECISION whichever row wins. Rows that
+        # can neither reach their checkpoint nor that score anymore stop now, with their bound as
+        # score, so they still lose to every row that could be accepted. Row 0 (the accepted
+        # sequence) always runs out: re-initialisation starts from its end state.
+        if self.optimizing_full_lap or self.tempering or self.mode != "PRECISION" or self.stagnation_counter <= 20:
+            return
+        pop = self.population
+        idx = np.flatnonzero(pop.alive & ~pop.finished & ~pop.pruned)
+        idx = idx[idx != 0]
+        if not idx.size:
+            return
+        bound, can_finish = pop.reward_bound(idx)
+        hopeless = ~can_finish & (bound < self.best_segment_score - 1e-6)
+        rows = idx[hopeless]
+        if not rows.size:
+            return
+        pop.pruned[rows] = True
+        self.pruned_rows += rows.size
+        if self.verify_pruning:
+            return  # they keep running; audit_pruned() checks the verdict once they are done
+        self.pruned_frames += int(((pop.lengths[rows] - pop.step_index[rows]) * ACTION_REPEAT - pop.frame_counter[rows]).sum())
+        pop.alive[rows] = False
+        pop.reward[rows] = bound[hopeless]
+
+    def audit_pruned(self, rows):
+        # verify_pruning: no row judged hopeless may have finished or reached the acceptance score.
+        pop = self.population
+        rows = rows[pop.pruned[rows]]
+        wrong = pop.finished[rows] | (pop.reward[rows] >= self.best_segment_score)
+        self.pruning_violations += int(wrong.sum())
+
+    def prepare_next_attempt(self):
+        prof = PROFILER if PROFILER.enabled else None
+        if prof: t = prof.now()
+        pop = self.population
+        if self.verify_pruning: self.audit_pruned(np.arange(self.n_cars))
+        self.store_results(np.arange(self.n_cars))
+        finished = np.flatnonzero(pop.finished)
+
+        if finished.size and not self.optimizing_full_lap:
+            self.generation += 1
+            best_finisher = int(finished[np.argmax(pop.reward[finished])])
+            if self.telemetry: self.emit_telemetry(committed=True)
+            if prof: prof.lap("prepare_next_attempt", t)
+            self.commit_segment(best_finisher)
+            return
+
+        if self.tempering: self.fold_replicas()
+        else:
+            self.generation += 1
+            self.fold_result(int(np.argmax(pop.reward)))
+        if self.speculator: self.speculator.observe(self)
+        if self.telemetry: self.emit_telemetry()
+        if prof: prof.lap("prepare_next_attempt", t)
+        self.reset_car_to_segment_start()
+
+    def emit_telemetry(self, committed=False):
+        # One record per generation; death_steps are quantiles (0/10/50/90/100%) of the
+        # action index every car of the population stopped at.
+        self.telemetry.emit({
+            "generation": self.generation,
+            "checkpoint": self.start_checkpoint_idx,
+            "mode": self.mode,
+            "T": self.T,
+            "best_score": self.best_segment_score,
+            "accepted_score": self.accepted_score,
+            "stagnation": self.stagnation_counter,
+            "death_steps": np.percentile(self.population.step_index, (0, 10, 50, 90, 100)).tolist(),
+            "committed": committed,
+            "elapsed": time.perf_counter() - self.telemetry.started,
+        })
+
+    def fold_result(self, best, weight=1):
+        # One SA step on a finished candidate. weight scales stagnation and cooling so that
+        # steady-state mode (one result at a time) moves at the generational pace.
+        pop = self.population
+        score, used_actions, track = self.candidate(best)
+        self.record_best(best, score, used_actions, track, weight)
+        mode = self.mode
+
+        if pop.closest_dist[best] < 80 or self.stagnation_counter > 20:
+             self.mode = "PRECISION"; self.T = 20
+        elif self.stagnation_counter > 50:
+             self.mode = "PANIC"; self.T = 400
+        else:
+             self.mode = "COOLING"; self.T = max(10, self.T * self.cooling ** weight)
+
+        if self.optimizing_full_lap: self.mode = "PRECISION"; self.T = 20
+
+        if self.mode == "PRECISION":
+            if score >= self.best_segment_score:
+                self.accepted_score = score; self.current_segment_actions = used_actions
+                self.current_track = track
+            else:
+                self.current_segment_actions = self.best_segment_actions
+                self.current_track = self.best_track
+        else:
+            if score > self.accepted_score or self.accepted_score == -99999:
+                self.accepted_score = score
+                self.best_segment_actions = used_actions
+                self.current_segment_actions = used_actions
+                self.best_track = self.current_track = track
+            else:
+                try: prob = math.exp((score - self.accepted_score) / self.T)
+                except OverflowError: prob = 0
+                if random.random() < prob:
+                    self.accepted_score = score; self.current_segment_actions = used_actions
+                    self.current_track = track
+                else:
+                    self.current_segment_actions = self.best_segment_actions
+                    self.current_track = self.best_track
+
+        if PROFILER.enabled:
+            PROFILER.count("proposals")
+            PROFILER.count("accepted", self.current_segment_actions is used_actions)
+            if self.mode != mode: PROFILER.count(f"{mode}->{self.mode}")
+
+        if not self.optimizing_full_lap and self.stagnation_counter > 60:
+             self.current_segment_actions = self.get_smart_initialization(pop.get_state(0))
+             self.current_track = None
+             self.stagnation_counter = 0
+
+    def candidate(self, i):
+        pop = self.population
+        return pop.reward[i].item(), frozen(pop.actions[i, :pop.lengths[i]].copy()), pop.snapshot_track(i)
+
+    def record_best(self, i, score, used_actions, track, weight=1):
+        self.step_index_global = int(self.population.step_index[i])
+        if score > self.best_segment_score:
+            self.best_segment_score = score
+            self.best_segment_actions = used_actions
+            self.best_track = track
+            self.stagnation_counter = 0
+            if self.optimizing_full_lap:
+                total_frames = self.step_index_global * ACTION_REPEAT
+                self.best_lap_time = total_frames / 60
+        else:
+            self.stagnation_counter += weight
+
+    def fold_replicas(self):
+        # Parallel tempering counterpart of fold_result: one Metropolis step per replica on the
+        # best row of its slice, then neighbour swaps. The cold end stands in for the single chain.
+        pop = self.population
+        ladder = self.tempering
+        self.generation += 1
+        proposals = [self.candidate(int(rows[np.argmax(pop.reward[rows])])) for rows in ladder.slices]
+        best = int(np.argmax(pop.reward))
+        self.record_best(best, *self.candidate(best))
+        ladder.fold(proposals)
+        ladder.exchange()
+
+        coldest = ladder.replicas[0]
+        self.T = coldest.T
+        self.accepted_score = coldest.score
+        self.current_segment_actions = coldest.actions
+        self.current_track = coldest.track
+
+    def update(self):
+        if self.evaluator:
+            # Whole generation per call, simulated by the worker pool.
+            self.evaluator.evaluate(self.population, self.optimizing_full_lap)
+            self.prepare_next_attempt()
+            return
+
+        # Macro steps advance a whole action per call; the viewer keeps per-frame ticks to animate.
+        tick = self.population.macro_tick if self.macro_steps else self.population.tick
+        active_cars = tick(self.optimizing_full_lap)
+        if self.pruning and active_cars:
+            self.prune_hopeless()
+
+        if self.steady_state and not self.tempering:
+            pop = self.population
+            for i in np.flatnonzero(~pop.alive | pop.finished).tolist():
+                if self.verify_pruning: self.audit_pruned(np.array([i]))
+                self.store_results(np.array([i]))
+                if pop.finished[i] and not self.optimizing_full_lap:
+                    self.generation += 1
+                    self.steady_folds = 0
+                    if self.telemetry: self.emit_telemetry(committed=True)
+                    self.commit_segment(i)
+                    return
+                self.fold_result(i, 1 / self.n_cars)
+                self.steady_folds += 1
+                if self.steady_folds == self.n_cars:
+                    # Steady-state folds one car at a time; a population's worth counts as a generation.
+                    self.steady_folds = 0
+                    self.generation += 1
+                    if self.speculator: self.speculator.observe(self)
+                    if self.telemetry: self.emit_telemetry()
+                self.launch_slot(i)
+            return
+
+        if active_cars == 0:
+            self.prepare_next_attempt()
+
+#### HEADLESS TRAINING #####
+
+def evaluate_rows(data, max_vel, rotation_vel, optimizing_full_lap):
+    # Worker entry point: simulate a slice of the population to completion.
+    pop = Population.from_rows(data, max_vel, rotation_vel)
+    pop.run_to_completion(optimizing_full_lap)
+    return pop.export_rows(slice(None))
+
+
+def speculate_segment(start_state, checkpoint_idx, generations, seed, n_cars=N_CARS):
+    # Worker entry point: anneal the segment towards checkpoint_idx from a guessed start state for
+    # up to `generations` generations. (actions, score, whether a candidate reached the checkpoint,
+    # seconds spent).
+    start = time.perf_counter()
+    random.seed(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = TrainingManager(os.path.join(tmp, "speculation.pkl"), n_cars)
+        manager.start_state, manager.start_checkpoint_idx = start_state, checkpoint_idx
+        manager.current_segment_actions = manager.get_smart_initialization(start_state)
+        manager.best_segment_actions = manager.current_segment_actions
+        manager.reset_car_to_segment_start()
+        pop = manager.population
+        for _ in range(generations):
+            pop.run_to_completion()
+            manager.store_results(np.arange(manager.n_cars))
+            finished = np.flatnonzero(pop.finished)
+            if finished.size:
+                i = int(finished[np.argmax(pop.reward[finished])])
+                return pop.actions[i, :pop.lengths[i]].tobytes(), pop.reward[i].item(), True, time.perf_counter() - start
+            manager.fold_result(int(np.argmax(pop.reward)))
+            manager.reset_car_to_segment_start()
+        return manager.best_segment_actions.tobytes(), manager.best_segment_score, False, time.perf_counter() - start
+
+
+def train_headless(manager, steps=None, until_checkpoint=None):
+    # Runs the SA loop as fast as the CPU allows: no window, no clock.tick(FPS).
+    manager.reset_car_to_segment_start()
+    frames = 0
+    start = time.perf_counter()
+
+    try:
+        while steps is None or frames < steps:
+            if until_checkpoint is not None:
+                if manager.optimizing_full_lap or manager.start_checkpoint_idx >= until_checkpoint:
+                    break
+            manager.update()
+            frames += 1
+            if PROFILER.enabled: PROFILER.maybe_dump()
+    except KeyboardInterrupt:
+        print("Interrupted.")
+
+    elapsed = time.perf_counter() - start
+    manager.save_model()
+    manager.close()
+    unit = "generations" if manager.evaluator else "actions" if manager.macro_steps else "frames"
+    print(f"Headless run: {frames} {unit} in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.0f} {unit}/s), CP: {manager.start_checkpoint_idx}")
+    cache = manager.result_cache
+    print(f"Result cache: {cache.hits} hits / {cache.misses} misses ({cache.hit_rate():.0%})")
+    if manager.use_snapshots:
+        print(f"Snapshots: {manager.resumed_steps} steps resumed instead of re-simulated")
+    if manager.tempering:
+        print(manager.tempering.report())
+    print(manager.journal.report())
+    if manager.pruning:
+        if manager.verify_pruning:
+            print(f"Pruning (verify only): {manager.pruned_rows} candidates judged hopeless, "
+                  f"{manager.pruning_violations} of them finished or scored enough")
+        else:
+            candidates = max(manager.generation * manager.n_cars, 1)
+            print(f"Pruning: {manager.pruned_rows} candidates stopped early ({manager.pruned_rows / candidates:.2%} of "
+                  f"~{candidates}), {manager.pruned_frames} frames skipped")
+    if manager.speculator:
+        print(manager.speculator.report())
+    if manager.mutations:
+        print(f"Mutations: {manager.effective_mutation_rate():.0%} of {manager.mutations} change an executed action")
+    if manager.telemetry:
+        print(manager.telemetry.report())
+    if PROFILER.enabled:
+        print("\n".join(PROFILER.summary_lines()))
+        if PROFILER.dump_path: PROFILER.dump()
+    return frames
@@ -0,0 +1,113 @@
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from simulation import speculate_segment, frozen, CHECKPOINTS
+
+
+class SpeculativeJob:
+    def __init__(self, checkpoint_idx, state, future):
+        self.checkpoint_idx = checkpoint_idx
+        self.state = state
+        self.future = future
+
+    def ready(self):
+        return self.future.done() and not self.future.cancelled() and self.future.exception() is None
+
+
+class Speculator:
+    # Pipelined segment training. While segment k anneals, worker processes pre-train segment
+    # k+1 from where the candidates closest to checkpoint k were when they got nearest to it
+    # (one job per cell of a coarse position/angle/velocity grid). When k commits, a finished
+    # job that started close enough to the real start state hands over its sequence as the
+    # warm start instead of get_smart_initialization().
+    def __init__(self, workers, generations=40, near=80, tolerance=(40, 30, 1.5)):
+        self.workers = workers
+        self.generations = generations
+        self.near = near
+        self.tolerance = tolerance
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.jobs = []
+        self.cells = set()
+        self.in_flight = []
+        self.warm = False
+        self.segment_start = time.perf_counter()
+        self.submitted = 0
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+        self.worker_seconds = 0.0
+        self.segments = {True: [], False: []}  # warm started? -> [(generations, seconds)]
+
+    def cell(self, state):
+        return (int(state["x"] // self.tolerance[0]), int(state["y"] // self.tolerance[0]),
+                int(state["angle"] % 360 // self.tolerance[1]), round(state["vel"] / self.tolerance[2]))
+
+    def close_to(self, a, b):
+        dist, angle, vel = self.tolerance
+        return (abs(a["x"] - b["x"]) < dist and abs(a["y"] - b["y"]) < dist
+                and abs((a["angle"] - b["angle"] + 180) % 360 - 180) < angle and abs(a["vel"] - b["vel"]) < vel)
+
+    def observe(self, manager):
+        # After each generation of segment k: queue jobs for near-checkpoint states in new cells.
+        cp = manager.start_checkpoint_idx
+        if manager.optimizing_full_lap or cp == len(CHECKPOINTS) - 1:
+            return
+        self.in_flight = [f for f in self.in_flight if not f.done()]
+        pop = manager.population
+        near = np.flatnonzero(pop.closest_dist < self.near)
+        target = CHECKPOINTS[cp]
+        for i in near[np.argsort(pop.closest_dist[near])].tolist():
+            if len(self.in_flight) >= self.workers:
+                return
+            state = pop.approach_state(i, target)
+            if self.cell(state) in self.cells:
+                continue
+            self.cells.add(self.cell(state))
+            future = self.pool.submit(speculate_segment, state, cp + 1, self.generations, self.submitted,
+                                      manager.n_cars)
+            self.jobs.append(SpeculativeJob(cp + 1, state, future))
+            self.in_flight.append(future)
+            self.submitted += 1
+
+    def finish_segment(self, generations):
+        now = time.perf_counter()
+        self.segments[self.warm].append((generations, now - self.segment_start))
+        self.segment_start = now
+        self.warm = False
+
+    def claim(self, checkpoint_idx, state):
+        # Segment k just committed with start state `state` for checkpoint_idx: warm start or None.
+        # Jobs for any other start are obsolete either way.
+        close = [job for job in self.jobs if job.checkpoint_idx == checkpoint_idx and self.close_to(job.state, state)]
+        ready = [job.future.result() for job in close if job.ready()]
+        for job in self.jobs:
+            job.future.cancel()
+        self.jobs = []
+        self.cells = set()
+        if not ready:
+            if close: self.late += 1
+            else: self.misses += 1
+            return None
+        actions, score, finished, seconds = max(ready, key=lambda result: (result[2], result[1]))
+        self.hits += 1
+        self.worker_seconds += seconds
+        self.warm = True
+        return frozen(np.frombuffer(actions, dtype=np.uint8))
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def report(self):
+        def average(runs, k):
+            return sum(run[k] for run in runs) / len(runs) if runs else 0.0
+        warm, cold = self.segments[True], self.segments[False]
+        claims = self.hits + self.late + self.misses
+        laps = max(len(warm) + len(cold), 1) / len(CHECKPOINTS)
+        saved = (average(cold, 1) - average(warm, 1)) * len(warm) if warm and cold else 0.0
+        return "\n".join([
+            f"Speculation: {self.submitted} jobs, {self.hits} hits, {self.late} still running, {self.misses} misses "
+            f"({self.hits / claims if claims else 0:.0%} of commits warm started)",
+            f"Warm segments: {average(warm, 0):.0f} generations / {average(warm, 1):.1f}s to commit, "
+            f"cold: {average(cold, 0):.0f} / {average(cold, 1):.1f}s",
+            f"Time saved: {saved:.1f}s ({saved / laps:.1f}s per lap), {self.worker_seconds:.1f}s of worker time reused",
+        ])
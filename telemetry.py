@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+
+
+class TelemetryWriter:
+    # Streams one record per generation to a JSONL file for offline analysis. emit() only
+    # appends to a bounded in-memory buffer; a background thread writes it out in batches.
+    # If the disk can't keep up, the oldest buffered records are dropped (and counted) instead
+    # of stalling the trainer. Files rotate at max_bytes: path, path.1, ... path.<keep>.
+    def __init__(self, path, max_buffer=10000, batch=256, interval=2.0, max_bytes=50_000_000, keep=5):
+        self.path = path
+        self.batch = batch
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.buffer = deque(maxlen=max_buffer)
+        self.cond = threading.Condition()
+        self.flushing = False
+        self.busy = False
+        self.closed = False
+        self.thread = None
+        self.started = time.perf_counter()
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.writes = 0
+
+    def emit(self, record):
+        with self.cond:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+            self.buffer.append(record)
+            self.emitted += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+                self.thread.start()
+            if len(self.buffer) >= self.batch:
+                self.cond.notify()
+
+    def run(self):
+        # Writes once a batch is full, on flush/close, or every `interval` seconds otherwise.
+        ready = lambda: self.closed or len(self.buffer) >= (1 if self.flushing else self.batch)
+        while True:
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+                self.cond.wait_for(ready, timeout=self.interval)
+                if self.closed and not self.buffer:
+                    return
+                records = list(self.buffer)
+                self.buffer.clear()
+                self.busy = bool(records)
+            if records:
+                try:
+                    self.write(records)
+                except OSError as e:
+                    print(f"Telemetry write failed: {e!r}")
+
+    def write(self, records):
+        data = "".join(json.dumps(r) + "\n" for r in records)
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+        with open(self.path, "a") as f:
+            f.write(data)
+        self.written += len(records)
+        self.writes += 1
+
+    def rotate(self):
+        for k in range(self.keep - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{k}"):
+                os.replace(f"{self.path}.{k}", f"{self.path}.{k + 1}")
+        os.replace(self.path, self.path + ".1")
+
+    def flush(self):
+        # Blocks until everything emitted so far is written.
+        with self.cond:
+            if self.thread is None:
+                return
+            self.flushing = True
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: not self.buffer and not self.busy)
+            self.flushing = False
+
+    def close(self):
+        self.flush()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.closed = False
+
+    def report(self):
+        return (f"Telemetry: {self.written} records in {self.writes} writes to {self.path}"
+                + (f", {self.dropped} dropped" if self.dropped else ""))
+
+
+def telemetry_files(path):
+    # Oldest rotated file first, live file last.
+    rotated = []
+    k = 1
+    while os.path.exists(f"{path}.{k}"):
+        rotated.append(f"{path}.{k}")
+        k += 1
+    return rotated[::-1] + ([path] if os.path.exists(path) else [])
+
+
+def load_telemetry(path):
+    # Column name -> NumPy array, one entry per record across the rotated files. List-valued
+    # fields (like death step quantiles) become 2-D arrays.
+    records = []
+    for name in telemetry_files(path):
+        with open(name) as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return {}
+    return {key: np.array([r.get(key) for r in records]) for key in records[0]}
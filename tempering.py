@@ -0,0 +1,97 @@
+import math
+import random
+import numpy as np
+
+
+class Replica:
+    # One annealing chain pinned to a fixed temperature.
+    def __init__(self, T):
+        self.T = T
+        self.actions = []
+        self.score = -99999
+        self.track = None
+        self.proposed = 0
+        self.accepted = 0
+        self.worse = 0
+        self.worse_accepted = 0
+
+    def accepts(self, score):
+        if score > self.score or self.score == -99999:
+            return True
+        try: prob = math.exp((score - self.score) / self.T)
+        except OverflowError: prob = 0
+        return random.random() < prob
+
+    def acceptance_rate(self):
+        return self.accepted / self.proposed if self.proposed else 0.0
+
+    def worse_acceptance_rate(self):
+        # Equal scores (mutations past the crash point) always pass, so this is the rate that
+        # actually reflects the temperature.
+        return self.worse_accepted / self.worse if self.worse else 0.0
+
+
+class ReplicaLadder:
+    # Parallel tempering: each replica owns a slice of the population rows and proposes from its
+    # own sequence at its own temperature. After every generation neighbours on the ladder swap
+    # states with the Metropolis criterion, so good sequences found hot sink to the cold end.
+    def __init__(self, temperatures, n_cars):
+        if len(temperatures) > n_cars:
+            raise ValueError(f"{len(temperatures)} replicas need at least as many cars, got {n_cars}")
+        self.replicas = [Replica(T) for T in sorted(temperatures)]
+        self.slices = np.array_split(np.arange(n_cars), len(temperatures))
+        self.context = None
+        self.parity = 0
+        self.swaps_tried = [0] * (len(temperatures) - 1)
+        self.swaps_done = [0] * (len(temperatures) - 1)
+
+    @classmethod
+    def geometric(cls, count, n_cars, t_min=20, t_max=400):
+        # Default ladder spans the trainer's PRECISION and PANIC temperatures.
+        if count == 1:
+            return cls([t_min], n_cars)
+        ratio = (t_max / t_min) ** (1 / (count - 1))
+        return cls([t_min * ratio ** k for k in range(count)], n_cars)
+
+    def seed(self, context, actions):
+        # Every replica restarts from the same sequence whenever the segment/mode changes.
+        self.context = context
+        for replica in self.replicas:
+            replica.actions = actions
+            replica.score = -99999
+            replica.track = None
+
+    def fold(self, proposals):
+        # proposals[r] = (score, actions, track) of the best row in replica r's slice.
+        for replica, (score, actions, track) in zip(self.replicas, proposals):
+            replica.proposed += 1
+            worse = score < replica.score
+            replica.worse += worse
+            if replica.accepts(score):
+                replica.accepted += 1
+                replica.worse_accepted += worse
+                replica.score = score
+                replica.actions = actions
+                replica.track = track
+
+    def exchange(self):
+        # Alternate even/odd neighbour pairs so every pair gets a chance every two generations.
+        for k in range(self.parity, len(self.replicas) - 1, 2):
+            cold, hot = self.replicas[k], self.replicas[k + 1]
+            self.swaps_tried[k] += 1
+            delta = (hot.score - cold.score) * (1 / cold.T - 1 / hot.T)
+            if delta >= 0 or random.random() < math.exp(delta):
+                self.swaps_done[k] += 1
+                cold.score, hot.score = hot.score, cold.score
+                cold.actions, hot.actions = hot.actions, cold.actions
+                cold.track, hot.track = hot.track, cold.track
+        self.parity ^= 1
+
+    def report(self):
+        lines = [f"T={r.T:6.1f}: {r.acceptance_rate():4.0%} accepted ({r.accepted}/{r.proposed}), "
+                 f"worse moves {r.worse_acceptance_rate():4.0%} ({r.worse_accepted}/{r.worse}), score {r.score:.0f}"
+                 for r in self.replicas]
+        for k, (tried, done) in enumerate(zip(self.swaps_tried, self.swaps_done)):
+            rate = done / tried if tried else 0.0
+            lines.append(f"swap {k}<->{k + 1}: {rate:4.0%} ({done}/{tried})")
+        return "\n".join(lines)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# simulation loads its track pack and images by relative path at import time, and needs no window.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
@@ -0,0 +1,50 @@
+import os
+import random
+import tempfile
+from array import array
+from simulation import TrainingManager, Population, ACTIONS, CHECKPOINTS, N_CARS, frozen
+
+
+def run_generations(manager, generations, on_generation=None):
+    target = manager.generation + generations
+    while manager.generation < target:
+        generation = manager.generation
+        manager.update()
+        if on_generation and manager.generation != generation:
+            on_generation(manager)
+
+
+def record_run(configure=None, generations=40, seed=0):
+    # Accepted sequence after every generation: a segment run, then a full-lap run.
+    random.seed(seed)
+    log = []
+    record = lambda m: log.append((m.accepted_score, m.start_checkpoint_idx, m.current_segment_actions.tobytes()))
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = TrainingManager(os.path.join(tmp, "check.pkl"))
+        if configure: configure(manager)
+        manager.reset_car_to_segment_start()
+        run_generations(manager, generations, record)
+        manager.committed_actions = array("B", manager.random_actions(300).tobytes())
+        manager.start_full_optimization()
+        run_generations(manager, generations, record)
+        manager.close()
+    return log
+
+
+def random_runs(trials=6, seed=0):
+    # (trial, start state, checkpoint index, one action sequence per car): the first two trials
+    # start from the track's start pose, the rest next to a random checkpoint at a random angle
+    # and speed.
+    rng = random.Random(seed)
+    for trial in range(trials):
+        cp = rng.randrange(len(CHECKPOINTS))
+        start = None if trial < 2 else {"x": CHECKPOINTS[cp][0] - 20, "y": CHECKPOINTS[cp][1] - 20,
+                                        "angle": rng.randrange(0, 360, 4), "vel": rng.uniform(0, 4)}
+        actions = [frozen([rng.randrange(len(ACTIONS)) for _ in range(rng.randint(20, 150))]) for _ in range(N_CARS)]
+        yield trial, start, cp, actions
+
+
+def population(start, cp, actions):
+    pop = Population(N_CARS, 4, 4)
+    pop.reset(start, actions, cp)
+    return pop
@@ -0,0 +1,22 @@
+from simulation import Car, TRACK_FIELD, CHECKPOINT_FIELD, RAY_SENSOR
+
+# Precomputed fields and caches against the reference implementations they replace.
+
+
+def test_track_field_matches_mask_overlap():
+    assert TRACK_FIELD.verify() == 0
+
+
+def test_checkpoint_table_matches_mask_overlap():
+    assert CHECKPOINT_FIELD.verify() == 0
+
+
+def test_sprite_cache_matches_exact_rotation():
+    assert Car.SPRITES.error(range(-720, 720, 4)) == 0
+
+
+def test_ray_casts_match_pixel_march():
+    mean, p99, overshoot = RAY_SENSOR.verify()
+    assert mean < 2 * RAY_SENSOR.cell
+    assert p99 < 16 * RAY_SENSOR.cell
+    assert overshoot <= RAY_SENSOR.cell  # never reads more than a block past a wall
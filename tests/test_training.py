@@ -0,0 +1,73 @@
+import os
+import random
+import numpy as np
+from simulation import TrainingManager, ROW_FIELDS
+from parallel import ParallelEvaluator
+from support import record_run, random_runs, population
+
+# Speed-ups that must not change what the trainer accepts: same seed, same accepted sequences.
+
+
+def test_snapshot_resume_matches_full_resimulation():
+    assert record_run(lambda m: setattr(m, "use_snapshots", False)) == record_run()
+
+
+def test_result_cache_matches_fresh_simulation():
+    assert record_run(lambda m: setattr(m, "use_result_cache", False)) == record_run()
+
+
+def test_worker_pool_matches_single_process():
+    evaluator = ParallelEvaluator(2)
+    try:
+        pooled = record_run(lambda m: setattr(m, "evaluator", evaluator))
+    finally:
+        evaluator.close()
+    assert pooled == record_run()
+
+
+def test_macro_steps_match_per_frame_ticks():
+    # Row arrays after per-frame ticks vs whole-action macro ticks, then whole training runs.
+    for trial, start, cp, actions in random_runs():
+        full = trial % 2 == 1
+        runs = []
+        for macro in (False, True):
+            pop = population(start, cp, actions)
+            pop.run_to_completion(full, macro)
+            runs.append(pop.export_rows(slice(None)))
+        per_frame, macro = runs
+        for f in ROW_FIELDS:
+            np.testing.assert_array_equal(per_frame[f], macro[f], err_msg=f"trial {trial}: {f}")
+    assert record_run(lambda m: setattr(m, "macro_steps", True)) == record_run()
+
+
+def test_pruning_bound_holds():
+    # At every frame of random segment runs: rows the bound says can't reach the checkpoint
+    # never finish, and nothing else ends above it.
+    for trial, start, cp, actions in random_runs():
+        pop = population(start, cp, actions)
+        bounds = []
+        while True:
+            idx = np.flatnonzero(pop.alive & ~pop.finished)
+            bounds.append((idx, *pop.reward_bound(idx)))
+            if not pop.tick():
+                break
+        for idx, bound, can_finish in bounds:
+            finished = pop.finished[idx]
+            assert not (finished & ~can_finish).any(), f"trial {trial}"
+            assert not (~finished & (pop.reward[idx] > bound + 1e-6)).any(), f"trial {trial}"
+
+
+def test_steady_state_keeps_folding(tmp_path, updates=5000, window=500):
+    # With the result cache on, most refills are cache hits; they must still count as results.
+    random.seed(1)
+    manager = TrainingManager(os.path.join(tmp_path, "check.pkl"))
+    manager.steady_state = manager.macro_steps = True
+    manager.reset_car_to_segment_start()
+    stalls = 0
+    for _ in range(updates // window):
+        generation = manager.generation
+        for _ in range(window):
+            manager.update()
+        stalls += manager.generation == generation
+    manager.close()
+    assert stalls == 0
@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import zipfile
+import argparse
+import numpy as np
+import pygame
+from utils import scale_image
+from collision import CarMaskBank, TrackField
+from sensors import RaySensor
+
+# A track pack is everything the simulation derives from a track's images, compiled once into an
+# uncompressed .npz next to them: the border bitmap, its SDF, every collision bin, every ray
+# sensor table, plus the checkpoints, start pose and start line. Loading one maps the arrays
+# straight from the file instead of spending ~10 s rebuilding them in every process. Packs are
+# keyed by a hash of the track definition and its source images; bump PACK_VERSION when
+# collision.py or sensors.py change how the fields are derived.
+
+PACK_VERSION = 2
+PACK_DIR = "track_packs"
+DEFAULT_TRACK = "classic"
+
+TRACKS = {
+    "classic": {
+        "track": "imgs/track.png",
+        "border": "imgs/track-border.png",
+        "scale": 0.9,
+        "grass": "imgs/grass.jpg",
+        "grass_scale": 2.5,
+        "finish": "imgs/finish.png",
+        "finish_position": [130, 250],
+        "start_line": [[130, 250], [130, 370]],
+        "car": "imgs/red-car.png",
+        "car_scale": 0.55,
+        "start_pos": [180, 200],
+        "checkpoints": [
+            [176, 129], [121, 81], [62, 125], [61, 444], [249, 674],
+            [404, 631], [502, 487], [600, 613], [739, 642], [737, 443],
+            [647, 365], [475, 367], [407, 315], [480, 265], [641, 257],
+            [653, 78], [345, 76], [281, 158], [280, 329], [176, 345],
+        ],
+    },
+}
+
+
+class TrackPack:
+    def __init__(self, name, definition, arrays):
+        self.name = name
+        self.definition = definition
+        self.arrays = arrays
+        self.checkpoints = [tuple(p) for p in arrays["checkpoints"].tolist()]
+        self.start_pos = tuple(arrays["start_pos"].tolist())
+        self.finish_position = tuple(arrays["finish_position"].tolist())
+        self.start_line = [tuple(p) for p in arrays["start_line"].tolist()]
+
+
+def track_hash(definition):
+    # Everything the derived fields depend on: the definition and the images it points at.
+    h = hashlib.sha256(json.dumps([PACK_VERSION, definition], sort_keys=True).encode())
+    for key in ("border", "car"):
+        with open(definition[key], "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def pack_path(name):
+    return os.path.join(PACK_DIR, name + ".npz")
+
+
+def load_images(definition):
+    scale = definition["scale"]
+    return {
+        "grass": scale_image(pygame.image.load(definition["grass"]), definition["grass_scale"]),
+        "track": scale_image(pygame.image.load(definition["track"]), scale),
+        "border": scale_image(pygame.image.load(definition["border"]), scale),
+        "finish": pygame.image.load(definition["finish"]),
+        "car": scale_image(pygame.image.load(definition["car"]), definition["car_scale"]),
+    }
+
+
+def build_pack(name, path=None):
+    definition = TRACKS[name]
+    path = path or pack_path(name)
+    start = time.perf_counter()
+    images = load_images(definition)
+    car_masks = CarMaskBank(images["car"])
+    field = TrackField(pygame.mask.from_surface(images["border"]), car_masks)
+    for b in range(car_masks.bins):
+        field.build_bin(b)
+    sensor = RaySensor(field)
+    for b in range(sensor.bins):
+        sensor.build_bin(b)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path,
+             hash=np.array(track_hash(definition)),
+             occupancy=field.occupancy,
+             sdf=field.sdf,
+             collision_grids=field.grids,
+             ray_tables=sensor.tables,
+             checkpoints=np.array(definition["checkpoints"], dtype=np.int64),
+             start_pos=np.array(definition["start_pos"], dtype=np.int64),
+             finish_position=np.array(definition["finish_position"], dtype=np.int64),
+             start_line=np.array(definition["start_line"], dtype=np.int64))
+    os.replace(tmp_path, path)
+    print(f"Built track pack {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s")
+
+
+def map_npz(path):
+    # np.load() reads .npz members into memory; uncompressed members are plain .npy files inside
+    # the zip, so the big ones can be memory-mapped in place instead (read-only, shared by every
+    # process that maps the same file).
+    arrays = {}
+    with zipfile.ZipFile(path) as z, open(path, "rb") as f:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {info.filename} is compressed")
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len(".npy")]
+            if dtype.hasobject or int(np.prod(shape)) * dtype.itemsize < 65536:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(
+                    shape, order="F" if fortran else "C")
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran else "C")
+    return arrays
+
+
+def track_parser():
+    # --track for scripts that import simulation; use it as a parent parser so --help lists it.
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--track", default=os.environ.get("TRACK", DEFAULT_TRACK), choices=list(TRACKS),
+                        help="track to load by name (same as TRACK=<name>)")
+    return parser
+
+
+def select_track(argv):
+    # simulation builds its fields at import time, so --track has to be applied before that.
+    # An unknown name exits with argparse's usage error.
+    args, _ = track_parser().parse_known_args(argv[1:])
+    os.environ["TRACK"] = args.track
+
+
+def load_track(name=DEFAULT_TRACK):
+    # Maps the track's pack, (re)building it first if it's missing, unreadable or stale.
+    if name not in TRACKS:
+        raise KeyError(f"Unknown track {name!r}, expected one of {', '.join(TRACKS)}")
+    definition = TRACKS[name]
+    path = pack_path(name)
+    expected = track_hash(definition)
+    try:
+        arrays = map_npz(path)
+        if arrays["hash"].item() == expected:
+            return TrackPack(name, definition, arrays)
+        print(f"Track pack {path} is stale, rebuilding.")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Track pack {path} is unreadable ({e!r}), rebuilding.")
+    build_pack(name, path)
+    return TrackPack(name, definition, map_npz(path))
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    parser = argparse.ArgumentParser(description="Compile track packs from imgs/")
+    parser.add_argument("names", nargs="*", default=list(TRACKS), help="tracks to compile (default: all)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the pack is up to date")
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in TRACKS:
+            sys.exit(f"Unknown track {name!r}, expected one of {', '.join(TRACKS)}")
+        if args.force:
+            build_pack(name)
+        start = time.perf_counter()
+        pack = load_track(name)
+        print(f"{name}: {len(pack.checkpoints)} checkpoints, loads in {(time.perf_counter() - start) * 1e3:.1f} ms")
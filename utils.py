@@ -1,19 +1,73 @@
-import pygame
-
-
-def scale_image(img, factor):
-    size = round(img.get_width() * factor), round(img.get_height() * factor)
-    return pygame.transform.scale(img, size)
-
-
-def blit_rotate_center(win, image, top_left, angle):
-    rotated_image = pygame.transform.rotate(image, angle)
-    new_rect = rotated_image.get_rect(
-        center=image.get_rect(topleft=top_left).center)
-    win.blit(rotated_image, new_rect.topleft)
-
-
-def blit_text_center(win, font, text):
-    render = font.render(text, 1, (200, 200, 200))
-    win.blit(render, (win.get_width()/2 - render.get_width() /
-                      2, win.get_height()/2 - render.get_height()/2))
+import pygame
+import math
+from collections import OrderedDict
+
+
+def scale_image(img, factor):
+    size = round(img.get_width() * factor), round(img.get_height() * factor)
+    return pygame.transform.scale(img, size)
+
+
+def blit_rotate_center(win, image, top_left, angle):
+    rotated_image = pygame.transform.rotate(image, angle)
+    new_rect = rotated_image.get_rect(
+        center=image.get_rect(topleft=top_left).center)
+    return win.blit(rotated_image, new_rect.topleft)
+
+
+def blit_text_center(win, font, text):
+    render = font.render(text, 1, (200, 200, 200))
+    win.blit(render, (win.get_width()/2 - render.get_width() /
+                      2, win.get_height()/2 - render.get_height()/2))
+
+
+def rect_round(value):
+    # pygame.Rect rounds float coordinates half away from zero.
+    return math.floor(value + 0.5) if value >= 0 else math.ceil(value - 0.5)
+
+
+class SpriteCache:
+    # Rotated copies of one image keyed by quantized angle, with the offset that centers them
+    # the way blit_rotate_center does. Built on first use; least recently used angles are
+    # dropped past max_entries, so memory stays bounded whatever the angle range.
+    def __init__(self, image, angle_step=1, max_entries=360):
+        self.image = image
+        self.angle_step = angle_step
+        self.bins = round(360 / angle_step)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, angle):
+        key = round(angle / self.angle_step) % self.bins
+        entry = self.entries.get(key)
+        if entry is None:
+            rotated = pygame.transform.rotate(self.image, key * self.angle_step)
+            if pygame.display.get_surface() is not None:
+                rotated = rotated.convert_alpha()  # display format blits several times faster
+            offset = (self.image.get_width() // 2 - rotated.get_width() // 2,
+                      self.image.get_height() // 2 - rotated.get_height() // 2)
+            entry = self.entries[key] = (rotated, offset)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return entry
+
+    def blit(self, win, top_left, angle):
+        rotated, (dx, dy) = self.get(angle)
+        return win.blit(rotated, (rect_round(top_left[0]) + dx, rect_round(top_left[1]) + dy))
+
+    def error(self, angles):
+        # Mean absolute per-channel difference (0-255) against blit_rotate_center over the given angles.
+        size = 2 * max(self.image.get_size())
+        exact, cached = pygame.Surface((size, size)), pygame.Surface((size, size))
+        pos = (size / 4, size / 4)
+        total = 0.0
+        for angle in angles:
+            exact.fill((0, 0, 0))
+            cached.fill((0, 0, 0))
+            blit_rotate_center(exact, self.image, pos, angle)
+            self.blit(cached, pos, angle)
+            diff = pygame.surfarray.pixels3d(exact).astype(int) - pygame.surfarray.pixels3d(cached)
+            total += abs(diff).mean()
+        return total / max(len(angles), 1)